@@ -0,0 +1,69 @@
+"""Per-call overhead of crew.kickoff() versus the direct fast path, with a stubbed LLM.
+
+The LLM answers instantly with a canned response, so the timings are pure
+orchestration overhead (prompt building, Task/Crew construction, Crew's agent loop).
+
+Run from the api/ directory:
+    python -m benchmarks.bench_fast_path --calls 200
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import time
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from utils.crew import agent_maneger
+from utils.llm_pool import llm_pool
+
+QUESTIONS = {"mcqs": [{"question": "What is 2 + 2?", "options": ["3", "4", "5", "6"], "correct": "B"}]}
+# Crew's output parser needs a "Final Answer:"; the fast path returns the text as is
+RESPONSE = "Thought: I now can give a great answer\nFinal Answer: " + json.dumps(QUESTIONS)
+SESSION_ID = "bench-fast-path"
+
+
+def time_calls(calls: int, fast_path: bool) -> list:
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        # Crew is verbose; keep its output off the terminal but inside the measurement
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent_maneger.run_agent("Generate 1 Mcqs from the stored pdf content", SESSION_ID,
+                                    query="", fast_path=fast_path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings: list) -> None:
+    ms = sorted(t * 1000 for t in timings)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"{name:<14} mean {statistics.mean(ms):8.3f} ms   p50 {statistics.median(ms):8.3f} ms   p95 {p95:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--context-words", type=int, default=20000)
+    args = parser.parse_args()
+
+    llm_pool.reset(factory=lambda: FakeListChatModel(responses=[RESPONSE]))
+    agent_maneger.create_agent(SESSION_ID)
+    agent_maneger.add_to_context(SESSION_ID, " ".join(f"word{i % 997}" for i in range(args.context_words)))
+
+    # Warm up imports and lazy initialisation on both paths
+    time_calls(3, fast_path=False)
+    time_calls(3, fast_path=True)
+
+    crew = time_calls(args.calls, fast_path=False)
+    fast = time_calls(args.calls, fast_path=True)
+    report("crew.kickoff", crew)
+    report("fast path", fast)
+    print(f"speedup        {statistics.mean(crew) / statistics.mean(fast):.1f}x")
+
+    agent_maneger.clean_session(SESSION_ID)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Time, memory peak and output size of PDF text extraction across document shapes.
+
+Synthetic PDFs are generated locally with PyMuPDF:
+    text_heavy   dense pages of small print
+    many_pages   thousands of pages with a few lines each
+    huge_page    a single very large page full of text
+    images       pages dominated by embedded (incompressible) images
+
+Each (document, mode) pair runs in a fresh process so that memory peaks and the
+extraction pool's start-up are measured independently. "py peak" and "rss +MB" are
+the measuring process's own; "workers MB" is the summed peak RSS of the extraction
+pool's worker processes (Linux only), which decode the pages in the parallel modes. A mode configures how
+utils.pdf_parser.extract_text runs; add an entry to MODES to compare a new one.
+
+Run from the api/ directory:
+    python -m benchmarks.bench_pdf_extract --repeat 5
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import fitz
+
+from config import Config
+
+WORDS = ("the cell membrane regulates transport of ions and molecules while mitochondria "
+         "produce energy through respiration chlorophyll absorbs light for photosynthesis").split()
+
+
+def _lines(rng: random.Random, count: int, words: int = 14) -> str:
+    return "\n".join(" ".join(rng.choices(WORDS, k=words)) for _ in range(count))
+
+
+def text_heavy(scale: float) -> fitz.Document:
+    rng = random.Random(1)
+    doc = fitz.open()
+    for _ in range(max(1, int(60 * scale))):
+        page = doc.new_page()
+        page.insert_text((24, 30), _lines(rng, 105, 18), fontsize=6)
+    return doc
+
+
+def many_pages(scale: float) -> fitz.Document:
+    rng = random.Random(2)
+    doc = fitz.open()
+    for _ in range(max(1, int(2000 * scale))):
+        page = doc.new_page(width=300, height=200)
+        page.insert_textbox(page.rect + (12, 12, -12, -12), _lines(rng, 3, 6), fontsize=9)
+    return doc
+
+
+def huge_page(scale: float) -> fitz.Document:
+    rng = random.Random(3)
+    doc = fitz.open()
+    # 14400 pt is the largest page side PDF readers are required to support
+    page = doc.new_page(width=14400, height=14400)
+    columns = max(1, int(12 * scale))
+    width = page.rect.width / columns
+    for column in range(columns):
+        page.insert_text((column * width + 10, 16), _lines(rng, 2350, 40), fontsize=5)
+    return doc
+
+
+def images(scale: float) -> fitz.Document:
+    rng = random.Random(4)
+    doc = fitz.open()
+    for _ in range(max(1, int(30 * scale))):
+        page = doc.new_page()
+        pixmap = fitz.Pixmap(fitz.csRGB, 800, 800, rng.randbytes(800 * 800 * 3), 0)
+        page.insert_image(fitz.Rect(36, 36, page.rect.width - 36, 500), pixmap=pixmap)
+        page.insert_textbox(fitz.Rect(36, 520, page.rect.width - 36, page.rect.height - 36),
+                            _lines(rng, 20), fontsize=9)
+    return doc
+
+
+SHAPES = {"text_heavy": text_heavy, "many_pages": many_pages, "huge_page": huge_page, "images": images}
+
+# name -> (Config overrides, pass the PDF as "bytes" or as a "path")
+MODES = {
+    "serial/bytes": ({"PDF_WORKERS": 1}, "bytes"),
+    "serial/path": ({"PDF_WORKERS": 1}, "path"),
+    "default/bytes": ({}, "bytes"),
+    "default/path": ({}, "path"),
+    "parallel/bytes": ({"PDF_PARALLEL_MIN_PAGES": 1}, "bytes"),
+    "parallel/path": ({"PDF_PARALLEL_MIN_PAGES": 1}, "path"),
+}
+
+
+def peak_rss(pid: int) -> int:
+    """Peak resident set size of a process in bytes (VmHWM), or 0 where /proc is unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def measure(path: str, mode: str, repeat: int, overrides: dict, conn) -> None:
+    """Child process: run one mode repeat times, then once more under tracemalloc."""
+    settings, kind = MODES[mode]
+    for name, value in {**settings, **overrides}.items():
+        setattr(Config, name, value)
+    from utils import pdf_parser
+    from utils.pdf_parser import extract_text, shutdown
+
+    if kind == "bytes":
+        with open(path, "rb") as f:
+            source = f.read()
+    else:
+        source = path
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract_text(source)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    extract_text(source)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The workers outlive every run, so their peaks cover all of them; read before shutdown
+    workers = pdf_parser._pool._processes.values() if pdf_parser._pool is not None else ()
+
+    conn.send({
+        "first": timings[0],
+        "median": statistics.median(timings[1:] or timings),
+        "python_peak": python_peak,
+        "rss_growth": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) * 1024,
+        "worker_peak": sum(peak_rss(process.pid) for process in workers),
+        "chars": len(text),
+    })
+    # Stop the extraction pool so this process can exit (see pdf_parser.shutdown)
+    shutdown()
+    conn.close()
+
+
+def run_mode(path: str, mode: str, repeat: int, overrides: dict) -> dict:
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=measure, args=(path, mode, repeat, overrides, sender))
+    process.start()
+    sender.close()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per mode; the first includes pool start-up")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies each document's size")
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--workers", type=int, help="override Config.PDF_WORKERS for non-serial modes")
+    parser.add_argument("--pages-per-task", type=int, help="override Config.PDF_PAGES_PER_TASK")
+    args = parser.parse_args()
+
+    overrides = {}
+    if args.workers:
+        overrides["PDF_WORKERS"] = args.workers
+    if args.pages_per_task:
+        overrides["PDF_PAGES_PER_TASK"] = args.pages_per_task
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'document':<12}{'mode':<16}{'first ms':>10}{'median ms':>11}{'py peak MB':>12}"
+              f"{'rss +MB':>9}{'workers MB':>12}{'chars':>11}")
+        for shape in args.shapes.split(","):
+            doc = SHAPES[shape](args.scale)
+            path = os.path.join(directory, f"{shape}.pdf")
+            doc.save(path, deflate=True)
+            pages = doc.page_count
+            doc.close()
+            print(f"{shape}: {pages} pages, {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+            for mode in args.modes.split(","):
+                mode_overrides = {key: value for key, value in overrides.items()
+                                  if not (key == "PDF_WORKERS" and mode.startswith("serial"))}
+                result = run_mode(path, mode, max(1, args.repeat), mode_overrides)
+                print(f"{'':<12}{mode:<16}{result['first'] * 1000:>10.1f}{result['median'] * 1000:>11.1f}"
+                      f"{result['python_peak'] / (1024 * 1024):>12.2f}{result['rss_growth'] / (1024 * 1024):>9.1f}"
+                      f"{result['worker_peak'] / (1024 * 1024):>12.1f}{result['chars']:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Offline load test of the whole API with a stubbed, deterministic LLM.
+
+Virtual users each create a session, upload a synthetic PDF, send a weighted mix of
+/generate, /chat, /shorts_check and /shorts_check_batch requests, then delete the
+session. Requests go straight to the ASGI app in-process (no network, no API quota).
+The fake LLM sleeps --llm-latency seconds per call and returns --questions questions,
+so agent threads, semaphores and caches behave as they would against Gemini.
+
+Run from the api/ directory:
+    python -m benchmarks.load_test --users 32 --concurrency 16 --requests-per-user 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import resource
+import statistics
+import time
+
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import fitz
+import httpx
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from config import Config
+from utils.llm_pool import llm_pool
+from utils.metrics import stage_duration
+from utils.response_cache import response_cache
+
+WORDS = ("cell membrane protein energy light water carbon oxygen enzyme gene tissue organ "
+         "nucleus mitochondria chlorophyll glucose respiration diffusion osmosis hormone").split()
+_call_ids = itertools.count(1)
+
+
+class FakeGemini(FakeListChatModel):
+    """Answers every call with fresh, seeded question JSON after a fixed delay."""
+
+    latency: float = 0.0
+    questions: int = 5
+
+    def _call(self, *args, **kwargs) -> str:
+        time.sleep(self.latency)
+        rng = random.Random(next(_call_ids))
+        items = [{
+            "question": "Explain how " + " ".join(rng.choices(WORDS, k=8)) + "?",
+            "options": [" ".join(rng.choices(WORDS, k=3)) for _ in range(4)],
+            "correct": rng.choice("ABCD"),
+            "index": n + 1,
+            "is_correct": rng.choice(["correct", "partial", "not_correct"]),
+            "explanation": " ".join(rng.choices(WORDS, k=20)),
+        } for n in range(self.questions)]
+        # Crew's output parser needs a "Final Answer:"; the JSON parser skips the preamble
+        return "Thought: I now can give a great answer\nFinal Answer: " + json.dumps({"mcqs": items})
+
+
+def make_pdf(pages: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        text = "\n".join(" ".join(rng.choices(WORDS, k=12)) for _ in range(45))
+        page.insert_textbox(page.rect + (36, 36, -36, -36), text, fontsize=10)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, args, pdfs: list):
+        self.client = client
+        self.args = args
+        self.pdfs = pdfs
+        self.mix = parse_mix(args.mix)
+        self.latencies = {}
+        self.errors = {}
+
+    async def call(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return response
+
+    def short_answer(self, rng: random.Random) -> dict:
+        return {"question": "What does " + rng.choice(WORDS) + " do?",
+                "answer": " ".join(rng.choices(WORDS, k=rng.randint(3, 12)))}
+
+    async def user(self, n: int) -> None:
+        rng = random.Random(n)
+        chat_id = (await self.call("session", "POST", "/session")).json()["chat_id"]
+        pdf = self.pdfs[n % len(self.pdfs)]
+        await self.call("upload", "POST", f"/upload/{chat_id}", files={"file": ("doc.pdf", pdf, "application/pdf")})
+
+        names, weights = list(self.mix), list(self.mix.values())
+        for _ in range(self.args.requests_per_user):
+            name = rng.choices(names, weights)[0]
+            if name == "generate":
+                params = {"typeof": rng.choice(["mcq", "short"]), "count": rng.choice([5, 10, 20])}
+                await self.call(name, "POST", f"/generate/{chat_id}", params=params)
+            elif name == "chat":
+                await self.call(name, "POST", f"/chat/{chat_id}", json={"prompt": "Summarise the " + rng.choice(WORDS)})
+            elif name == "shorts_check":
+                await self.call(name, "POST", f"/shorts_check/{chat_id}", params=self.short_answer(rng))
+            elif name == "shorts_check_batch":
+                items = [self.short_answer(rng) for _ in range(self.args.batch_items)]
+                await self.call(name, "POST", f"/shorts_check_batch/{chat_id}", json={"items": items})
+        await self.call("delete", "DELETE", f"/session/{chat_id}")
+
+    async def run(self) -> float:
+        slots = asyncio.Semaphore(self.args.concurrency)
+
+        async def limited(n: int) -> None:
+            async with slots:
+                await self.user(n)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(n) for n in range(self.args.users)))
+        return time.perf_counter() - start
+
+
+def percentile(values: list, q: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def report(test: LoadTest, elapsed: float, rss_before: float) -> None:
+    total = sum(len(values) for values in test.latencies.values())
+    print(f"{'endpoint':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in sorted(test.latencies.items()):
+        ms = sorted(value * 1000 for value in values)
+        print(f"{name:<20}{len(ms):>9}{test.errors.get(name, 0):>8}{statistics.median(ms):>10.1f}"
+              f"{percentile(ms, 0.95):>10.1f}{percentile(ms, 0.99):>10.1f}")
+    print(f"\n{total} requests in {elapsed:.2f} s = {total / elapsed:.1f} req/s")
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"RSS {rss_before:.0f} MB before, {rss_mb():.0f} MB after, {peak:.0f} MB peak")
+
+    print(f"\n{'stage (server side)':<36}{'calls':>8}{'mean ms':>10}")
+    totals = {}
+    for (_, stage), values in stage_duration.series.items():
+        count, seconds = totals.get(stage, (0, 0.0))
+        totals[stage] = (count + values[-1], seconds + values[-2])
+    for stage, (count, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{stage:<36}{count:>8}{seconds / count * 1000:>10.2f}")
+
+
+async def main_async(args) -> None:
+    # Imported late so the fake LLM and settings are in place first
+    from main import app
+
+    pdfs = [make_pdf(args.pages, seed) for seed in range(args.distinct_pdfs)]
+    rss_before = rss_mb()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as client:
+        test = LoadTest(client, args, pdfs)
+        elapsed = await test.run()
+    report(test, elapsed, rss_before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=16, help="virtual users running at once")
+    parser.add_argument("--requests-per-user", type=int, default=10)
+    parser.add_argument("--mix", default="generate=3,chat=2,shorts_check=4,shorts_check_batch=1",
+                        help="endpoint=weight pairs")
+    parser.add_argument("--batch-items", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--questions", type=int, default=5, help="questions per fake LLM response")
+    parser.add_argument("--pages", type=int, default=20, help="pages per synthetic PDF")
+    parser.add_argument("--distinct-pdfs", type=int, default=4)
+    parser.add_argument("--fast-path", action="store_true", help="bypass Crew on every endpoint")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    args = parser.parse_args()
+
+    llm_pool.reset(factory=lambda: FakeGemini(responses=[""], latency=args.llm_latency, questions=args.questions))
+    if args.fast_path:
+        Config.FAST_PATH_ENDPOINTS = {"generate", "chat", "shorts_check"}
+    if args.no_cache:
+        response_cache.backend = None
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -16,12 +16,104 @@ class Config:
     
   
     MAX_PDF_SIZE = int(os.getenv("MAX_PDF_SIZE", 10 * 1024 * 1024))  # 10MB default
-    
+
+    # Logs are written by a background thread: "json" or "text" lines at LOG_LEVEL and
+    # above, keeping a LOG_SAMPLE_RATE fraction of DEBUG/INFO events
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    # CrewAI's verbose output prints every prompt, including the document context
+    CREW_VERBOSE = os.getenv("CREW_VERBOSE", "false").lower() in ("1", "true", "yes")
+
+    # PDF extraction: documents with at least PDF_PARALLEL_MIN_PAGES pages are split
+    # into PDF_PAGES_PER_TASK page ranges and decoded on PDF_WORKERS processes
+    PDF_WORKERS = int(os.getenv("PDF_WORKERS", os.cpu_count() or 1))
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 32))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 64))
+    # Uploads above MAX_PDF_SIZE are spooled to a temp file in blocks of this size
+    PDF_SPOOL_BLOCK_SIZE = int(os.getenv("PDF_SPOOL_BLOCK_SIZE", 1024 * 1024))
+    # Processed documents are cached by content hash and shared across sessions
+    PDF_CACHE_MAX_ENTRIES = int(os.getenv("PDF_CACHE_MAX_ENTRIES", 256))
+    PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+    # Retrieval: stored content is split into CHUNK_SIZE character chunks and only the
+    # RETRIEVAL_TOP_K best matching ones (up to CONTEXT_TOKEN_BUDGET tokens) are sent
+    CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 1200))
+    CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 200))
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 8))
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 6000))
+    # "bm25" (lexical) or "dense" (embeddings). EMBEDDING_MODEL is a local
+    # sentence-transformers model name, or "hashing" for the dependency-free embedder
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "bm25")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "hashing")
+    EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", 384))
+
+    # Every agent shares one of LLM_POOL_SIZE pooled clients
+    LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-pro")
+    LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", 0.7))
+    LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 4))
+    # USD per million input / output tokens, for the cost figures in /admin/stats
+    LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", 1.25))
+    LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", 10.0))
+    # /admin/stats requires it in the X-Admin-Key header, and is disabled while it is unset
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+
+    # Maximum number of agent (LLM) runs executing at the same time
+    AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", 16))
+    # ...and for a single session; /generate splits counts above GENERATE_BATCH_SIZE
+    # into parallel sub-requests over disjoint parts of the document
+    TENANT_MAX_CONCURRENCY = int(os.getenv("TENANT_MAX_CONCURRENCY", 4))
+    # Comma-separated endpoints (generate, chat, shorts_check) that call the LLM
+    # directly instead of through a one-task Crew
+    FAST_PATH_ENDPOINTS = {name.strip() for name in os.getenv("FAST_PATH_ENDPOINTS", "").split(",") if name.strip()}
+    GENERATE_BATCH_SIZE = int(os.getenv("GENERATE_BATCH_SIZE", 10))
+    # Generated questions whose estimated Jaccard similarity to one already served
+    # to the session reaches DEDUP_THRESHOLD are dropped. Only content words are
+    # compared, so questions sharing a template but not a topic stay well below it
+    DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.7))
+
+    # Where sessions and their stored content live: "memory" (this process only) or
+    # "sqlite" (a WAL-mode file shared by every worker on the host, kept across restarts)
+    SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")
+    SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "sessions.sqlite3")
+    # Sessions idle for SESSION_TTL seconds are deleted; while the document text and
+    # indexes held in this process exceed SESSION_MEMORY_BUDGET bytes the least recently
+    # used sessions are unloaded (their text stays in the memory store, so with that
+    # backend only indexes and cached documents are freed). Checked every
+    # SESSION_SWEEP_INTERVAL seconds
+    SESSION_TTL = float(os.getenv("SESSION_TTL", 2 * 60 * 60))
+    SESSION_MEMORY_BUDGET = int(os.getenv("SESSION_MEMORY_BUDGET", 1024 * 1024 * 1024))
+    SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", 60))
+    # The sqlite store records a read as "last used" at most once per this many seconds
+    SESSION_TOUCH_INTERVAL = float(os.getenv("SESSION_TOUCH_INTERVAL", 60))
+
+    # Response cache for /generate and /shorts_check: "memory", "sqlite" or "none"
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 24 * 60 * 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+    # /shorts_check reuses the grade of an earlier answer to the same question that
+    # normalizes to the same text (or, if GRADING_CACHE_SIMILARITY > 0, whose
+    # embedding is at least that similar); up to GRADING_CACHE_MAX_ANSWERS per question
+    GRADING_CACHE_MAX_QUESTIONS = int(os.getenv("GRADING_CACHE_MAX_QUESTIONS", 1000))
+    GRADING_CACHE_MAX_ANSWERS = int(os.getenv("GRADING_CACHE_MAX_ANSWERS", 200))
+    GRADING_CACHE_SIMILARITY = float(os.getenv("GRADING_CACHE_SIMILARITY", 0))
+    # /shorts_check_batch grades up to GRADE_BATCH_MAX_ITEMS answers (and about
+    # GRADE_BATCH_TOKEN_BUDGET tokens of questions and answers) per agent call
+    GRADE_BATCH_MAX_ITEMS = int(os.getenv("GRADE_BATCH_MAX_ITEMS", 20))
+    GRADE_BATCH_TOKEN_BUDGET = int(os.getenv("GRADE_BATCH_TOKEN_BUDGET", 2000))
+    GRADE_REQUEST_MAX_ITEMS = int(os.getenv("GRADE_REQUEST_MAX_ITEMS", 500))
+
     @classmethod
     def is_dev(cls):
         
         return cls.ENVIRONMENT == "dev"
     
+    @classmethod
+    def use_fast_path(cls, endpoint: str) -> bool:
+        return endpoint in cls.FAST_PATH_ENDPOINTS
+
     @classmethod
     def validate(cls):
        
@@ -33,6 +125,7 @@ class Config:
         print(f"🏠 Host:          {cls.HOST}")
         print(f"🔌 Port:          {cls.PORT}")
         print(f"📄 Max PDF Size:  {cls.MAX_PDF_SIZE / (1024*1024):.1f} MB")
+        print(f"🧵 PDF Workers:   {cls.PDF_WORKERS}")
         print(f"🔑 API Key Set:   {'✅ Yes' if cls.API_KEY else '❌ No (WILL FAIL!)'}")
         print("=" * 50)
         
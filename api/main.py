@@ -1,14 +1,28 @@
-git ifrom fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict
-from crewai import Crew, Task, Agent
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import Dict, List, Optional, Tuple
 from config import Config
 from utils.crew import agent_maneger
-from utils.pdf_parser import extract_text
+from utils.dedup import question_dedup, question_stem
+from utils.grading_cache import grading_cache, normalize_answer
+from utils.json_stream import JSONItemStream, parse_json
+from utils.log import get_logger
+from utils.metrics import MetricsMiddleware, render as render_metrics, span
+from utils.pdf_cache import CachedDocument, pdf_cache
+from utils.pdf_parser import shutdown as shutdown_pdf_pool, spool_to_tempfile
+from utils.response_cache import response_cache
+from utils.retrieval import estimate_tokens
+from utils.session_store import isoformat
 from utils.sessions import session_manager
+from utils.token_usage import set_typeof
+import anyio
+import asyncio
+import hmac
 import os
 import json
-import re
+log = get_logger("api")
 app = FastAPI(
     title=Config.APP_NAME,
     description="AI-powered question generation from PDFs",
@@ -23,18 +37,28 @@ def parse_agent_response(result: str):
     if not isinstance(result, str):
         raise ValueError("Agent response is not a string")
 
+    with span("parse_response"):
+        return parse_json(result)
+
+
+async def read_pdf_upload(file: UploadFile) -> CachedDocument:
+    """Extract text straight from the upload buffer, never touching the CWD.
+
+    Documents are content-addressed, so re-uploads of the same PDF skip extraction.
+    """
+    size = file.size
+    if size is None:
+        size = file.file.seek(0, os.SEEK_END)
+    await file.seek(0)
+    if size <= Config.MAX_PDF_SIZE:
+        with span("pdf_read"):
+            content = await file.read()
+        return await run_in_threadpool(pdf_cache.load, content)
+    path, digest = await run_in_threadpool(spool_to_tempfile, file.file)
     try:
-        return json.loads(result)
-    except Exception:
-        m = re.search(r'(\{[\s\S]*\}|\[[\s\S]*\])', result)
-        if m:
-            candidate = m.group(1)
-            try:
-                return json.loads(candidate)
-            except Exception:
-                candidate2 = candidate.replace("'", '"')
-                return json.loads(candidate2)
-        raise ValueError("Could not parse agent response as JSON")
+        return await run_in_threadpool(pdf_cache.load, path, digest)
+    finally:
+        os.remove(path)
 
 app.add_middleware(
     CORSMiddleware,
@@ -43,26 +67,78 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 from pydantic import BaseModel
 
+
+async def sweep_sessions():
+    while True:
+        await asyncio.sleep(Config.SESSION_SWEEP_INTERVAL)
+        try:
+            await run_in_threadpool(session_manager.sweep)
+        except Exception:
+            log.exception("session sweep failed")
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    app.state.session_sweeper = asyncio.create_task(sweep_sessions())
+
+
+@app.on_event("shutdown")
+async def stop_session_sweeper():
+    app.state.session_sweeper.cancel()
+
+
+@app.on_event("shutdown")
+def stop_pdf_pool():
+    shutdown_pdf_pool()
+
+
 @app.post("/health")
-def health():
+async def health():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/stats")
+def admin_stats(x_admin_key: Optional[str] = Header(None)):
+    # Disabled unless a key is configured
+    if not Config.ADMIN_API_KEY:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_key or "", Config.ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+    return {
+        **agent_maneger.get_stats(),
+        "resident_bytes": session_manager.resident_bytes(),
+        "pdf_cache": pdf_cache.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "grading_cache": grading_cache.get_stats()
+    }
+
 class ChatRequest(BaseModel):
     prompt: str
 
+class ShortAnswer(BaseModel):
+    question: str
+    answer: str
+
+class ShortsCheckBatchRequest(BaseModel):
+    items: List[ShortAnswer]
+
 @app.post("/session")
 def new_session():
     chat_id,data = session_manager.create_session()
     return { "chat_id":chat_id , 
-            "crew_session_id": data["crew_session_id"],
-            "created_at": data["created_at"]
+            "crew_session_id": data.crew_session_id,
+            "created_at": isoformat(data.created_at)
             }
 
 @app.get("/session/{chat_id}")
 def get_session_info(chat_id:str):
-    session = session_manager.get_session(chat_id)
+    session = session_manager.export_session(chat_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     else:
@@ -73,8 +149,7 @@ def delte_session(chat_id:str):
     session = session_manager.get_session(chat_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
-    agent_maneger.clean_session(session["crew_session_id"])
-    session_manager.delete_session(chat_id)
+    session_manager.end_session(chat_id)
     return {"message":"session deleted!!"}
 
 @app.post("/api/pdf/upload/{chat_id}")
@@ -83,71 +158,43 @@ async def upload(chat_id:str , file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
 
-    session = session_manager.get_session(chat_id)
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
     if not session:
         return{"error": "Invalid session"}
-    
-    file_path = f"temp_{chat_id}.pdf"
-    with open(file_path,"wb") as f:
-        f.write(file.file.read())
 
-    text = extract_text(file_path)    
+    document = await read_pdf_upload(file)
  
-    session["pdf_text"]=text
-    session["processed"]=True
+    await run_in_threadpool(session_manager.set_pdf, chat_id, document.text, document.digest)
 
-    agent_maneger.add_to_context(session["crew_session_id"],text)
-    os.remove(file_path)
+    await run_in_threadpool(agent_maneger.add_to_context, session.crew_session_id, document.text,
+                            index=document.index, key=document.digest)
     return {"message": "PDF processed & memory updated",
-            "text": text,
+            "text": document.text,
             "filename":file.filename
             }
 @app.post("/upload/{chat_id}")
 async def upload_pdf_to_session(chat_id:str, file:UploadFile=File(...)):
-    session = session_manager.get_session(chat_id)
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-    temp_path = f"temp_{chat_id}.pdf"
     try:
-        
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        pdf_text = extract_text(temp_path)
+        document = await read_pdf_upload(file)
         
        
-        session_manager.update_session(chat_id, {
-            "pdf_text": pdf_text,
-            "pdf_filename": file.filename,
-            "processed": True
-        })
-        agent_maneger.add_to_context(session["crew_session_id"],pdf_text)
+        # The session links to the shared document instead of holding its own copy
+        await run_in_threadpool(session_manager.set_pdf, chat_id, document.text, document.digest, file.filename)
+        await run_in_threadpool(agent_maneger.add_to_context, session.crew_session_id, document.text,
+                                index=document.index, key=document.digest)
         return {
             "message": "PDF processed and memory updated",
             "filename": file.filename
         }
     except Exception as ex:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(ex)}")
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
-@app.post("/generate/{chat_id}")         
-def generate(chat_id:str ,typeof:str,count:int ):
-
-    session = session_manager.get_session(chat_id)
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    if not session["processed"]:
-        raise HTTPException(status_code=400, detail="No PDF uploaded for this session")
-
-
-    crew_id = session["crew_session_id"]
 
+def build_generate_prompt(typeof: str, count: int) -> str:
     prompt=""
     if typeof=="mcq":
         prompt = f"Generate {count} Mcqs from the stored pdf content and given them in a json file with question,answer,correct answer,explanation why it is correct"
@@ -158,14 +205,78 @@ def generate(chat_id:str ,typeof:str,count:int ):
     
     else :
         raise HTTPException(status_code=400, detail="Invalid question type. Use: mcq, short, or long")
-    
-    result = agent_maneger.run_agent(prompt[:100],crew_id)
+    return prompt
 
-    try:
-        parsed = parse_agent_response(result)
-    except Exception as ex:
-        raise HTTPException(status_code=500, detail=f"Invalid JSON from agent: {str(ex)} | raw: {str(result)[:300]}")
 
+# Keys the agent (and this API's own responses) put question lists under
+QUESTION_LIST_KEYS = ("mcqs", "short_questions", "results", "questions", "question", "short_answer")
+
+
+def question_items(parsed) -> list:
+    """The list of questions in a parsed agent response.
+
+    A dict is searched for a known list key, then for any list of objects; otherwise it
+    is a single question, like {"question": ..., "options": [...]}.
+    """
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):
+        for key in QUESTION_LIST_KEYS:
+            if isinstance(parsed.get(key), list):
+                return parsed[key]
+        for value in parsed.values():
+            if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+                return value
+        return [parsed]
+    raise ValueError("Unrecognized JSON structure from agent")
+
+
+def merge_questions(batches: list, count: int) -> list:
+    """Concatenate question batches, dropping exact repeats of a question's text."""
+    seen = set()
+    merged = []
+    for batch in batches:
+        for question in batch:
+            text = question.get("question") if isinstance(question, dict) else question
+            key = " ".join(str(text).lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(question)
+    return merged[:count]
+
+
+async def generate_batched(crew_id: str, typeof: str, count: int) -> dict:
+    """Generate count questions as parallel sub-requests over disjoint parts of the PDF.
+
+    If some sub-requests fail the rest are still returned, with "failed_parts" and
+    "missing_questions" saying what is missing.
+    """
+    parts = -(-count // Config.GENERATE_BATCH_SIZE)
+    sizes = [count // parts + (1 if i < count % parts else 0) for i in range(parts)]
+
+    async def run_part(i: int, size: int) -> list:
+        prompt = build_generate_prompt(typeof, size)
+        result = await agent_maneger.arun_agent(prompt[:100], crew_id, query="", part=(i, parts),
+                                                fast_path=Config.use_fast_path("generate"))
+        return question_items(parse_agent_response(result))
+
+    results = await asyncio.gather(*(run_part(i, size) for i, size in enumerate(sizes)),
+                                   return_exceptions=True)
+    batches = [result for result in results if not isinstance(result, BaseException)]
+    if not batches:
+        raise HTTPException(status_code=500, detail=f"Error generating questions: {str(results[0])}")
+    questions = merge_questions(batches, count)
+    payload = {("short_questions" if typeof == "short" else "mcqs"): questions}
+    failed = len(results) - len(batches)
+    if failed:
+        log.warning("generate sub-requests failed", session_id=crew_id, failed=failed, parts=parts)
+        payload["failed_parts"] = failed
+        payload["missing_questions"] = count - len(questions)
+    return payload
+
+
+def shape_generate_response(typeof: str, parsed) -> dict:
     if isinstance(parsed, list):
         if typeof == "short":
             return {"short_questions": parsed}
@@ -183,18 +294,169 @@ def generate(chat_id:str ,typeof:str,count:int ):
     else:
         raise HTTPException(status_code=500, detail="Unrecognized JSON structure from agent")
 
-@app.post("/shorts_check/{chat_id}")
-def shorts_check(chat_id: str, question:str , answer:str):
 
+def record_served_questions(chat_id: str, typeof: str, questions: list) -> None:
+    session_manager.add_message(chat_id, {
+        "role": "assistant",
+        "type": typeof,
+        "questions": [question_stem(question) for question in questions]
+    })
+
+
+def drop_served_questions(chat_id: str, typeof: str, response: dict) -> dict:
+    """Remove near-duplicates of questions this session was already given, then record the rest."""
+    key = "short_questions" if typeof == "short" else "mcqs"
     session = session_manager.get_session(chat_id)
+    kept, dropped = question_dedup.filter(chat_id, response[key], session.messages)
+    response[key] = kept
+    response["duplicates_dropped"] = dropped
+    record_served_questions(chat_id, typeof, kept)
+    return response
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def generate_response(crew_id: str, typeof: str, count: int) -> dict:
+    set_typeof(typeof)
+    prompt = build_generate_prompt(typeof, count)
+
+    if count > Config.GENERATE_BATCH_SIZE:
+        return await generate_batched(crew_id, typeof, count)
+    
+    # No query: sample context from across the whole document
+    result = await agent_maneger.arun_agent(prompt[:100],crew_id, query="",
+                                            fast_path=Config.use_fast_path("generate"))
+
+    try:
+        parsed = parse_agent_response(result)
+    except Exception as ex:
+        raise HTTPException(status_code=500, detail=f"Invalid JSON from agent: {str(ex)} | raw: {str(result)[:300]}")
+
+    return shape_generate_response(typeof, parsed)
+
+
+@app.post("/generate/{chat_id}")         
+async def generate(chat_id:str ,typeof:str,count:int, response: Response):
+
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if not session.processed:
+        raise HTTPException(status_code=400, detail="No PDF uploaded for this session")
+
+
+    crew_id = session.crew_session_id
+
+    # Validates typeof before any cache lookup
+    build_generate_prompt(typeof, count)
+
+    # Same documents + same request => same answer, unless this session has already been
+    # served questions, in which case it needs fresh ones
+    fingerprint = await run_in_threadpool(agent_maneger.context_fingerprint, crew_id)
+    cache_key = response_cache.key("generate", fingerprint, typeof, count)
+    payload = None
+    if not response_cache.enabled or any(message.get("questions") for message in session.messages):
+        cache_status = "BYPASS"
+    else:
+        payload = await run_in_threadpool(response_cache.get, cache_key)
+        cache_status = "HIT" if payload is not None else "MISS"
+
+    if payload is None:
+        payload = await generate_response(crew_id, typeof, count)
+        # A partial result would be served to every session on this document; only cache complete ones
+        if not payload.get("failed_parts"):
+            await run_in_threadpool(response_cache.set, cache_key, payload)
+    response.headers["X-Cache"] = cache_status
+    return await run_in_threadpool(drop_served_questions, chat_id, typeof, payload)
+
+@app.api_route("/generate/{chat_id}/stream", methods=["GET", "POST"])
+async def generate_stream(chat_id: str, typeof: str, count: int):
+    """Server-sent events variant of /generate.
+
+    Emits a "token" event per LLM delta, a "question" event as soon as each question
+    object is complete, then "done" (or "error").
+    """
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    if not session.processed:
+        raise HTTPException(status_code=400, detail="No PDF uploaded for this session")
+
+    crew_id = session.crew_session_id
+    prompt = build_generate_prompt(typeof, count)
+    set_typeof(typeof)
+
+    async def events():
+        parser = JSONItemStream()
+        served = []
+        dropped = 0
+
+        def fresh(questions: list) -> list:
+            nonlocal dropped
+            kept, duplicates = question_dedup.filter(chat_id, questions, session.messages)
+            dropped += duplicates
+            served.extend(kept)
+            return kept
+
+        try:
+            async for token in agent_maneger.astream_agent(prompt[:100], crew_id, query=""):
+                yield sse_event("token", {"text": token})
+                for question in fresh(parser.feed(token)):
+                    yield sse_event("question", question)
+
+            if not served and not dropped:
+                # No question list was recognized while streaming; use the whole value
+                for question in fresh(question_items(parser.close())):
+                    yield sse_event("question", question)
+        except Exception as ex:
+            yield sse_event("error", {"detail": str(ex)})
+            return
+        finally:
+            # Recorded even when the client disconnects and the stream is cancelled
+            with anyio.CancelScope(shield=True):
+                await run_in_threadpool(record_served_questions, chat_id, typeof, served)
+        yield sse_event("done", {"count": len(served), "duplicates_dropped": dropped})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def with_answer(graded: dict, answer: str) -> dict:
+    """A cached grade for a near-identical answer, restated for this answer."""
+    return {
+        key: [dict(item, answer=answer) if isinstance(item, dict) and "answer" in item else item for item in value]
+        if isinstance(value, list) else value
+        for key, value in graded.items()
+    }
+
+
+@app.post("/shorts_check/{chat_id}")
+async def shorts_check(chat_id: str, question:str , answer:str, response: Response):
+
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
     if not session:
         raise HTTPException(404, "Session not found")
 
-    if not session["processed"]:
+    if not session.processed:
         raise HTTPException(400, "No PDF uploaded for this session")
 
-    crew_id = session["crew_session_id"]
-    result = agent_maneger.run_agent(f"Check the given short answer question and answer from the stored pdf content and give the result in a json file with question,answer,is_correct correct/not_correct/partial in the form of string,explanation why it is correct or not and in the case of partial correct mention where the answer needs to improve. Question: {question}, Answer: {answer}", crew_id)
+    crew_id = session.crew_session_id
+    fingerprint = await run_in_threadpool(agent_maneger.context_fingerprint, crew_id)
+    cache_key = response_cache.key("shorts_check", fingerprint, question, answer)
+    cached = await run_in_threadpool(response_cache.get, cache_key)
+    if cached is not None:
+        response.headers["X-Cache"] = "HIT"
+        return cached
+    graded = await run_in_threadpool(grading_cache.get, fingerprint, question, answer)
+    if graded is not None:
+        response.headers["X-Cache"] = "NEAR"
+        return with_answer(graded, answer)
+    response.headers["X-Cache"] = "MISS" if response_cache.enabled else "BYPASS"
+
+    result = await agent_maneger.arun_agent(f"Check the given short answer question and answer from the stored pdf content and give the result in a json file with question,answer,is_correct correct/not_correct/partial in the form of string,explanation why it is correct or not and in the case of partial correct mention where the answer needs to improve. Question: {question}, Answer: {answer}", crew_id, query=f"{question} {answer}", fast_path=Config.use_fast_path("shorts_check"))
 
     try:
         parsed = parse_agent_response(result)
@@ -202,27 +464,165 @@ def shorts_check(chat_id: str, question:str , answer:str):
         raise HTTPException(status_code=500, detail=f"Invalid JSON from agent: {str(ex)} | raw: {str(result)[:300]}")
 
     if isinstance(parsed, list):
-        return {"short_answer": parsed}
+        graded = {"short_answer": parsed}
     elif isinstance(parsed, dict):
         if 'question' in parsed and isinstance(parsed['question'], list):
-            return parsed
-        return {"question": [parsed]}
+            graded = parsed
+        else:
+            graded = {"question": [parsed]}
     else:
         raise HTTPException(status_code=500, detail="Unrecognized JSON structure from agent")
+    await run_in_threadpool(store_grades, fingerprint, [(question, answer, graded)])
+    return graded
+
+
+def cached_grade(graded) -> Optional[dict]:
+    """The grade in a cached /shorts_check result, or None if the entry holds no usable grade."""
+    if graded is None:
+        return None
+    try:
+        items = question_items(graded)
+    except ValueError:
+        return None
+    return items[0] if items and isinstance(items[0], dict) else None
+
+
+def lookup_grades(fingerprint: str, items: List[ShortAnswer]) -> List[Optional[dict]]:
+    """Each item's cached grade, from the response cache or else the grading cache (blocking)."""
+    grades = []
+    for item in items:
+        grade = cached_grade(response_cache.get(response_cache.key("shorts_check", fingerprint, item.question, item.answer)))
+        if grade is None:
+            grade = cached_grade(grading_cache.get(fingerprint, item.question, item.answer))
+        grades.append(grade)
+    return grades
+
+
+def store_grades(fingerprint: str, graded: List[Tuple[str, str, dict]]) -> None:
+    """Cache /shorts_check results given as (question, answer, result) triples (blocking)."""
+    for question, answer, result in graded:
+        response_cache.set(response_cache.key("shorts_check", fingerprint, question, answer), result)
+        grading_cache.set(fingerprint, question, answer, result)
+
+
+def pack_grading_batches(items: List[ShortAnswer], indices: List[int]) -> List[List[int]]:
+    """Group items into as few agent calls as fit the per-call item and token limits."""
+    batches, batch, tokens = [], [], 0
+    for i in indices:
+        size = estimate_tokens(items[i].question) + estimate_tokens(items[i].answer)
+        if batch and (len(batch) >= Config.GRADE_BATCH_MAX_ITEMS or tokens + size > Config.GRADE_BATCH_TOKEN_BUDGET):
+            batches.append(batch)
+            batch, tokens = [], 0
+        batch.append(i)
+        tokens += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+async def grade_batch(crew_id: str, items: List[ShortAnswer], batch: List[int]) -> Dict[int, dict]:
+    """Grade the items of one batch in a single agent call; returns item index -> grade."""
+    numbered = "\n".join(f"{n}. Question: {items[i].question}, Answer: {items[i].answer}"
+                         for n, i in enumerate(batch, 1))
+    prompt = ("Check each of the numbered short answer questions and answers below from the stored pdf content and "
+              "give the result as a json array with one object per item, in the same order, with index (the item number), "
+              "question,answer,is_correct correct/not_correct/partial in the form of string,explanation why it is correct "
+              "or not and in the case of partial correct mention where the answer needs to improve.\n" + numbered)
+    query = " ".join(f"{items[i].question} {items[i].answer}" for i in batch)
+    result = await agent_maneger.arun_agent(prompt, crew_id, query=query, fast_path=Config.use_fast_path("shorts_check"))
+
+    returned = question_items(parse_agent_response(result))
+    graded = {}
+    for position, item in enumerate(returned):
+        if not isinstance(item, dict):
+            continue
+        if "index" in item:
+            try:
+                n = int(item["index"])
+            except (TypeError, ValueError):
+                continue
+        # Without an index, a grade's position identifies its item only if nothing was
+        # dropped or added and it echoes that item; anything else is left ungraded
+        elif len(returned) == len(batch) and echoes(item, items[batch[position]]):
+            n = position + 1
+        else:
+            continue
+        if 1 <= n <= len(batch) and batch[n - 1] not in graded:
+            graded[batch[n - 1]] = item
+    return graded
+
+
+def echoes(grade: dict, item: ShortAnswer) -> bool:
+    """Whether a grade repeats the question and answer of item."""
+    return (normalize_answer(str(grade.get("question", ""))) == normalize_answer(item.question)
+            and normalize_answer(str(grade.get("answer", ""))) == normalize_answer(item.answer))
+
+
+@app.post("/shorts_check_batch/{chat_id}")
+async def shorts_check_batch(chat_id: str, data: ShortsCheckBatchRequest):
+
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
+    if not session:
+        raise HTTPException(404, "Session not found")
+
+    if not session.processed:
+        raise HTTPException(400, "No PDF uploaded for this session")
+
+    items = data.items
+    if len(items) > Config.GRADE_REQUEST_MAX_ITEMS:
+        raise HTTPException(400, f"At most {Config.GRADE_REQUEST_MAX_ITEMS} items per request")
+
+    crew_id = session.crew_session_id
+    fingerprint = await run_in_threadpool(agent_maneger.context_fingerprint, crew_id)
+    results: List[dict] = [None] * len(items)
+    # Items whose question and answer normalize alike are graded once
+    pending: Dict[tuple, List[int]] = {}
+    # One threadpool call for every lookup, rather than one per item
+    grades = await run_in_threadpool(lookup_grades, fingerprint, items)
+    for i, (item, grade) in enumerate(zip(items, grades)):
+        if grade is not None:
+            results[i] = dict(grade, answer=item.answer)
+        else:
+            pending.setdefault((normalize_answer(item.question), normalize_answer(item.answer)), []).append(i)
+    cached = len(items) - sum(len(group) for group in pending.values())
+
+    groups = {group[0]: group for group in pending.values()}
+    batches = pack_grading_batches(items, list(groups))
+    outcomes = await asyncio.gather(*(grade_batch(crew_id, items, batch) for batch in batches),
+                                    return_exceptions=True)
+
+    fresh = []
+    for batch, outcome in zip(batches, outcomes):
+        for i in batch:
+            item = items[i]
+            grade = None if isinstance(outcome, BaseException) else outcome.get(i)
+            if grade is None:
+                error = f"Error grading answer: {str(outcome)}" if isinstance(outcome, BaseException) else "No grade returned by agent"
+                for j in groups[i]:
+                    results[j] = {"question": items[j].question, "answer": items[j].answer, "error": error}
+                continue
+            grade = dict(grade, question=item.question, answer=item.answer)
+            grade.pop("index", None)
+            fresh.append((item.question, item.answer, {"question": [grade]}))
+            for j in groups[i]:
+                results[j] = dict(grade, answer=items[j].answer)
+    await run_in_threadpool(store_grades, fingerprint, fresh)
+
+    return {"results": results, "cached": cached, "agent_calls": len(batches)}
 
 
 @app.post("/chat/{chat_id}")         
-def chat(chat_id: str, data: ChatRequest):
+async def chat(chat_id: str, data: ChatRequest):
 
-    session = session_manager.get_session(chat_id)
+    session = await run_in_threadpool(session_manager.get_session, chat_id)
     if not session:
         raise HTTPException(404, "Session not found")
 
-    if not session["processed"]:
+    if not session.processed:
         raise HTTPException(400, "No PDF uploaded for this session")
 
-    crew_id = session["crew_session_id"]
-    result = agent_maneger.run_agent(data.prompt[:100], crew_id)
+    crew_id = session.crew_session_id
+    result = await agent_maneger.arun_agent(data.prompt[:100], crew_id, fast_path=Config.use_fast_path("chat"))
 
     try:
         parsed = parse_agent_response(result)
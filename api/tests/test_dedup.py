@@ -0,0 +1,57 @@
+import pytest
+
+from utils.dedup import QuestionDeduplicator
+
+PARAPHRASES = [
+    ("What is the primary function of mitochondria in a cell?",
+     "What is the main function of the mitochondria in cells?"),
+    ("What is the powerhouse of the cell?",
+     "Which organelle is known as the powerhouse of the cell?"),
+    ("Which organelle produces ATP through cellular respiration?",
+     "Through cellular respiration, which organelle produces ATP?"),
+]
+
+DISTINCT = [
+    ("Which of the following best describes the role of mitochondria in the cell?",
+     "Which of the following best describes the role of ribosomes in the cell?"),
+    ("Which of the following best describes the role of mitochondria in the cell?",
+     "Which of the following best describes the role of the nucleus in the cell?"),
+    ("Which of the following describes the effect of temperature on enzyme activity?",
+     "Which of the following describes the effect of pH on enzyme activity?"),
+    ("Which statement about DNA replication is true?",
+     "Which statement about DNA replication is false?"),
+    ("What is the capital of France?", "What is the capital of Germany?"),
+    ("Define osmosis.", "Define diffusion."),
+]
+
+
+def served(*stems):
+    return [{"role": "assistant", "questions": list(stems)}]
+
+
+@pytest.mark.parametrize("first, second", PARAPHRASES)
+def test_paraphrase_of_served_question_is_dropped(first, second):
+    kept, dropped = QuestionDeduplicator().filter("chat", [{"question": second}], served(first.lower()))
+    assert (kept, dropped) == ([], 1)
+
+
+@pytest.mark.parametrize("first, second", DISTINCT)
+def test_question_sharing_only_a_template_is_kept(first, second):
+    kept, dropped = QuestionDeduplicator().filter("chat", [{"question": second}], served(first.lower()))
+    assert (kept, dropped) == ([{"question": second}], 0)
+
+
+def test_generated_questions_dedupe_each_other():
+    questions = [{"question": first} for first, _ in DISTINCT[2:]] + [{"question": PARAPHRASES[0][0]},
+                                                                       {"question": PARAPHRASES[0][1]}]
+    kept, dropped = QuestionDeduplicator().filter("chat", questions, [])
+    assert dropped == 1
+    assert kept == questions[:-1]
+
+
+def test_forget_clears_served_questions():
+    dedup = QuestionDeduplicator()
+    question = {"question": DISTINCT[0][0]}
+    dedup.filter("chat", [question], [])
+    dedup.forget("chat")
+    assert dedup.filter("chat", [question], []) == ([question], 0)
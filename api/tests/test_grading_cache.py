@@ -0,0 +1,15 @@
+from utils.grading_cache import GradingCache, normalize_answer
+
+
+def test_normalize_keeps_logical_connectives():
+    assert normalize_answer("Osmosis AND diffusion.") == "osmosis and diffusion"
+    assert normalize_answer("osmosis and diffusion") != normalize_answer("osmosis or diffusion")
+    assert normalize_answer("when it is heated") != normalize_answer("where it is heated")
+
+
+def test_answers_that_normalize_alike_share_a_grade():
+    cache = GradingCache(similarity=0)
+    cache.set("doc", "What is osmosis?", "The movement of water.", {"is_correct": "correct"})
+    assert cache.get("doc", "what is osmosis", "the movement of  WATER") == {"is_correct": "correct"}
+    assert cache.get("doc", "What is osmosis?", "The movement of salt.") is None
+    assert cache.get("other", "What is osmosis?", "The movement of water.") is None
@@ -0,0 +1,62 @@
+import pytest
+
+from utils.json_stream import JSONItemStream, parse_json
+
+REPAIRS = [
+    ('Here you go:\n```json\n{"mcqs": [{"question": "q"}]}\n```', {"mcqs": [{"question": "q"}]}),
+    ("{'question': 'What is it?', 'correct': 'A'}", {"question": "What is it?", "correct": "A"}),
+    ("{'answer': 'it's the cell's wall'}", {"answer": "it's the cell's wall"}),
+    ("{'answer': 'say \"hi\"'}", {"answer": 'say "hi"'}),
+    ('{"a": [1, 2, 3,], "b": 4,}', {"a": [1, 2, 3], "b": 4}),
+    ('{"a": [1,, 2]}', {"a": [1, 2]}),
+    ('{"a": [1 2 3]}', {"a": [1, 2, 3]}),
+    ('{"a": 1 "b": [true false null]}', {"a": 1, "b": [True, False, None]}),
+    ('[{"q": 1} {"q": 2}]', [{"q": 1}, {"q": 2}]),
+    ('["x" "y" -1.5e3]', ["x", "y", -1500.0]),
+    ('{"ok": True, "missing": None, "no": False}', {"ok": True, "missing": None, "no": False}),
+    ('{"a": [1, 2}', {"a": [1, 2]}),
+    ('{"mcqs": [{"question": "q", "options": ["a", "b"', {"mcqs": [{"question": "q", "options": ["a", "b"]}]}),
+    ('{"a": "unterminated', {"a": "unterminated"}),
+    ('{"a": 1} trailing text {"b": 2}', {"a": 1}),
+]
+
+
+@pytest.mark.parametrize("text, expected", REPAIRS)
+def test_repairs(text, expected):
+    assert parse_json(text) == expected
+
+
+def test_no_json_raises():
+    with pytest.raises(ValueError):
+        parse_json("I cannot help with that.")
+
+
+def feed_chunks(text, size):
+    parser = JSONItemStream()
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items, parser.close()
+
+
+@pytest.mark.parametrize("text, expected", REPAIRS)
+def test_chunk_boundaries_do_not_change_the_result(text, expected):
+    for size in range(1, len(text) + 1):
+        assert feed_chunks(text, size)[1] == expected, size
+
+
+def test_items_are_returned_as_they_close():
+    parser = JSONItemStream()
+    assert parser.feed('{"mcqs": [{"question": "one", "n": 12') == []
+    assert parser.feed('3}, {"question": "tw') == [{"question": "one", "n": 123}]
+    assert parser.feed('o"} {"question": "three"}') == [{"question": "two"}, {"question": "three"}]
+    assert parser.close() == {"mcqs": [{"question": "one", "n": 123}, {"question": "two"}, {"question": "three"}]}
+
+
+def test_items_split_at_every_boundary():
+    text = "{'mcqs': [{'question': 'it's 1', 'correct': True} {'question': 'b', 'n': [1 2]},]}"
+    expected = [{"question": "it's 1", "correct": True}, {"question": "b", "n": [1, 2]}]
+    for size in range(1, len(text) + 1):
+        items, value = feed_chunks(text, size)
+        assert items == expected, size
+        assert value == {"mcqs": expected}, size
@@ -0,0 +1,82 @@
+import time
+import uuid
+
+import pytest
+
+from utils.blob_store import blob_store
+from utils.session_store import MemorySessionStore, SessionRecord, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+
+
+def refs(store, handle):
+    if isinstance(store, MemorySessionStore):
+        return blob_store.refcounts.get(handle, 0)
+    row = store.conn.execute("SELECT refs FROM blobs WHERE handle = ?", (handle,)).fetchone()
+    return row[0] if row else 0
+
+
+def create(store):
+    chat_id = str(uuid.uuid4())
+    store.put(chat_id, SessionRecord(chat_id))
+    return chat_id
+
+
+def upload(store, chat_id, text, digest):
+    # What SessionManager.set_pdf and AgentManager.add_to_context store for an upload
+    handle = store.put_blob(text, digest)
+    previous = []
+
+    def apply(session):
+        previous.append(session.pdf_blob)
+        session.pdf_blob = handle
+        session.processed = True
+
+    assert store.update(chat_id, apply)
+    store.release_blob(previous[0])
+    key = f"pdf_content_{len(store.get_contexts(chat_id))}"
+    store.set_context(chat_id, key, store.put_blob(text, digest))
+
+
+def end(store, chat_id):
+    # What SessionManager.end_session releases
+    store.delete_contexts(chat_id)
+    session = store.delete(chat_id)
+    store.release_blob(session.pdf_blob)
+
+
+def test_refcounts_follow_uploads_deletes_and_expiry(store):
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    a, b = create(store), create(store)
+    upload(store, a, "first document", first)
+    upload(store, b, "first document", first)
+    assert refs(store, first) == 4
+
+    # Replacing a's PDF keeps its first context but drops the session's own reference
+    upload(store, a, "second document", second)
+    assert (refs(store, first), refs(store, second)) == (3, 2)
+    assert list(store.get_contexts(a).values()) == [first, second]
+
+    end(store, b)
+    assert store.get(b) is None and store.get_contexts(b) == {}
+    assert (refs(store, first), refs(store, second)) == (1, 2)
+    assert store.get_blob(first) == "first document"
+
+    assert store.expired(time.time() + 1) == [a]
+    end(store, a)
+    assert (refs(store, first), refs(store, second)) == (0, 0)
+    assert store.get_blob(first) is None and store.get_blob(second) is None
+    assert store.expired(time.time() + 1) == []
+
+
+def test_upload_to_a_missing_session_is_released(store):
+    digest = str(uuid.uuid4())
+    handle = store.put_blob("text", digest)
+    assert not store.update("missing", lambda session: None)
+    store.release_blob(handle)
+    assert refs(store, digest) == 0 and store.get_blob(digest) is None
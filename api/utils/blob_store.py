@@ -0,0 +1,64 @@
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+
+class BlobStore:
+    """Interned, reference-counted text blobs shared by every session.
+
+    Sessions keep the handle returned by intern() instead of the text itself, so any
+    number of sessions holding the same document share a single copy of it.
+    """
+
+    def __init__(self):
+        self.blobs: Dict[str, str] = {}
+        self.refcounts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def intern(self, text: str, key: Optional[str] = None) -> str:
+        """Take a reference to text and return its handle.
+
+        key defaults to the SHA-256 of the text; callers that already hold a content
+        hash (e.g. of the source PDF) can pass it to skip rehashing.
+        """
+        handle = key or hashlib.sha256(text.encode()).hexdigest()
+        with self._lock:
+            if handle in self.blobs:
+                self.refcounts[handle] += 1
+            else:
+                self.blobs[handle] = text
+                self.refcounts[handle] = 1
+        return handle
+
+    def get(self, handle: Optional[str]) -> Optional[str]:
+        if handle is None:
+            return None
+        return self.blobs.get(handle)
+
+    def release(self, handle: Optional[str]) -> None:
+        """Drop one reference; the text is freed with the last one."""
+        if handle is None:
+            return
+        with self._lock:
+            count = self.refcounts.get(handle)
+            if count is None:
+                return
+            if count > 1:
+                self.refcounts[handle] = count - 1
+            else:
+                del self.refcounts[handle]
+                del self.blobs[handle]
+
+    def texts(self) -> List[str]:
+        with self._lock:
+            return list(self.blobs.values())
+
+    def get_stats(self) -> dict:
+        return {
+            "blobs": len(self.blobs),
+            "references": sum(self.refcounts.values()),
+            "bytes": sum(len(text) for text in self.blobs.values()),
+        }
+
+
+blob_store = BlobStore()
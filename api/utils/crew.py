@@ -1,28 +1,49 @@
 from crewai import Agent, Crew, Task
-from typing import Dict, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-import json
-import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from langchain_core.messages import HumanMessage, SystemMessage
+from config import Config
+from utils.blob_store import blob_store
+from utils.llm_pool import collect_calls, llm_pool, total_usage
+from utils.log import get_logger
+from utils.metrics import record, span
+from utils.pdf_cache import pdf_cache
+from utils.retrieval import ChunkIndex, build_index, estimate_tokens, fit_budget, spread
+from utils.session_store import session_label, session_store
+from utils.token_usage import reported_usage, token_usage
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+
+log = get_logger("crew")
 
 
 class AgentManager:
     def __init__(self):
         self.agents: Dict[str, Agent] = {}
-        self.context_storage: Dict[str, Dict[str, str]] = {}  
+        self.context_storage: Dict[str, Dict[str, str]] = {}  # context key -> blob_store handle
+        self.indexes: Dict[str, Dict[str, ChunkIndex]] = {}
+        # Dedicated pool for blocking crew runs, so they can't starve Starlette's threadpool
+        self.executor = ThreadPoolExecutor(max_workers=Config.AGENT_MAX_CONCURRENCY,
+                                           thread_name_prefix="agent")
+        # Shared by runs and streams; every executor user holds one, so it never waits on a thread
+        self.agent_slots = asyncio.Semaphore(Config.AGENT_MAX_CONCURRENCY)
+        self.tenant_slots: Dict[str, asyncio.Semaphore] = {}
+        # Number of sessions loaded here whose context uses each blob handle
+        self.handle_refs: Counter = Counter()
+        self._lock = threading.Lock()
+        self._agent_lock = threading.Lock()
     
     def create_agent(self, session_id: str) -> Agent:
         if session_id in self.agents:
-            print(f"Using existing agent for session: {session_id}")
+            log.debug("agent reused", session_id=session_id)
             return self.agents[session_id]
         
-        self.context_storage[session_id] = {}
-        
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-pro",  
-            google_api_key=os.getenv("GEMINI_API_KEY"),  
-            temperature=0.7, 
-            convert_system_message_to_human=True  
-        )
+        llm = llm_pool.acquire()
         
         agent = Agent(
             role="Educational AI Assistant",
@@ -41,59 +62,187 @@ class AgentManager:
                         IMPORTANT: When asked to generate questions, you MUST respond ONLY with valid JSON.
                         Do not include any explanatory text, markdown formatting, or code blocks.
                         Just pure JSON that can be parsed directly.""",
-            verbose=True,
+            verbose=Config.CREW_VERBOSE,
             llm=llm,
             tools=[],
             allow_delegation=False,
         )
         
         self.agents[session_id] = agent
-        print(f"Created new agent for session: {session_id}")
+        log.info("agent created", session_id=session_id)
         return agent
 
-    def add_to_context(self, session_id: str, content: str, content_type: str = "pdf_content"):
-        """Add content to the session context."""
-        if session_id not in self.context_storage:
-            self.context_storage[session_id] = {}
+    def add_to_context(self, session_id: str, content: str, content_type: str = "pdf_content",
+                       index: Optional[ChunkIndex] = None, key: Optional[str] = None):
+        """Add content to the session context, reusing a prebuilt index when given.
+
+        The text is saved in session_store (under key, if the caller has a content hash)
+        and interned in this process's blob_store.
+        """
+        contexts = self._sync_context(session_id)
         
-        context_key = f"{content_type}_{len(self.context_storage[session_id])}"
-        self.context_storage[session_id][context_key] = content
+        context_key = f"{content_type}_{len(contexts)}"
+        handle = session_store.put_blob(content, key)
+        session_store.set_context(session_id, context_key, handle)
+        contexts[context_key] = blob_store.intern(content, handle)
+        self.indexes.setdefault(session_id, {})[context_key] = index or build_index(content)
+        with self._lock:
+            self.handle_refs[handle] += 1
         
-        print(f"Added {len(content)} characters to context for session: {session_id}")
-        print(f"Total context items: {len(self.context_storage[session_id])}")
+        log.info("context added", session_id=session_id, characters=len(content), items=len(contexts))
 
-    def get_context(self, session_id: str) -> str:
-        if session_id not in self.context_storage:
-            return ""
+    def _sync_context(self, session_id: str) -> Dict[str, str]:
+        """The session's context handles, loading any stored by another worker (or before a restart)."""
+        stored = session_store.get_contexts(session_id)
+        contexts = self.context_storage.get(session_id)
+        if contexts is not None and contexts.keys() == stored.keys():
+            return contexts
         
-        context_parts = []
-        for key, value in self.context_storage[session_id].items():
-            context_parts.append(f"[{key}]\n{value}\n")
+        with self._lock:
+            contexts = self.context_storage.setdefault(session_id, {})
+            indexes = self.indexes.setdefault(session_id, {})
+            for key in [key for key in contexts if key not in stored]:
+                self._release_handle(contexts.pop(key))
+                indexes.pop(key, None)
+            for key, handle in stored.items():
+                if key in contexts:
+                    continue
+                text = blob_store.get(handle) or session_store.get_blob(handle)
+                if text is None:
+                    continue
+                contexts[key] = blob_store.intern(text, handle)
+                self.handle_refs[handle] += 1
+                # Shares the index (and its single build) with every session on this document
+                indexes[key] = pdf_cache.put(handle, text).index
+            return contexts
+
+    def _release_handle(self, handle: str) -> None:
+        """Drop a session's reference to a context blob; call with self._lock held."""
+        blob_store.release(handle)
+        self.handle_refs[handle] -= 1
+        if self.handle_refs[handle] <= 0:
+            del self.handle_refs[handle]
+
+    def loaded_indexes(self) -> list:
+        """Every index held by a session loaded in this process."""
+        with self._lock:
+            return [index for indexes in self.indexes.values() for index in indexes.values()]
+
+    def context_fingerprint(self, session_id: str) -> str:
+        """Identifies the session's stored content: its blob handles, in order.
+
+        May load the session's context from the store and index it, so async callers
+        run it in a thread.
+        """
+        return ",".join(self._sync_context(session_id).values())
+
+    def get_context(self, session_id: str, query: Optional[str] = None,
+                    part: Optional[Tuple[int, int]] = None) -> str:
+        """Build the prompt context for a session.
+
+        Without a query every stored item is returned in full. With a query only the
+        top-k retrieved chunks that fit in Config.CONTEXT_TOKEN_BUDGET are returned; a query
+        that matches nothing (e.g. an empty one) samples chunks evenly across the content.
+        part=(i, n) restricts retrieval to the i-th of n disjoint, contiguous slices of
+        the chunks, so parallel requests see different parts of the document.
+        """
+        contexts = self._sync_context(session_id)
+        if not contexts:
+            return ""
         
-        return "\n".join(context_parts)
+        items = {key: blob_store.get(handle) for key, handle in contexts.items()}
+        budget = Config.CONTEXT_TOKEN_BUDGET
+        if part is None and (query is None or sum(estimate_tokens(value) for value in items.values()) <= budget):
+            context_parts = []
+            for key, value in items.items():
+                context_parts.append(f"[{key}]\n{value}\n")
+            
+            return "\n".join(context_parts)
+
+        indexes = self.indexes.get(session_id, {})
+        allowed = None
+        if part is not None:
+            all_chunks = [(key, chunk_id) for key, index in indexes.items() for chunk_id in range(len(index))]
+            i, n = part
+            allowed = set(all_chunks[i * len(all_chunks) // n:(i + 1) * len(all_chunks) // n]) or None
+
+        hits = []
+        for key, index in indexes.items():
+            # Over-fetch when restricted to a part, since most hits may fall outside it
+            k = Config.RETRIEVAL_TOP_K if allowed is None else Config.RETRIEVAL_TOP_K * part[1]
+            for chunk_id, score in index.search(query or "", k):
+                if allowed is None or (key, chunk_id) in allowed:
+                    hits.append((score, key, chunk_id))
+        hits.sort(reverse=True)
+        candidates = [(key, chunk_id, indexes[key].chunks[chunk_id])
+                      for _, key, chunk_id in hits[:Config.RETRIEVAL_TOP_K]]
+        if not candidates:
+            candidates = spread([(key, chunk_id, chunk)
+                                 for key, index in indexes.items()
+                                 for chunk_id, chunk in enumerate(index.chunks)
+                                 if allowed is None or (key, chunk_id) in allowed], budget)
 
-    def run_agent(self, prompt: str, session_id: str, include_context: bool = True) -> str:
-        if session_id not in self.agents:
+        order = {key: position for position, key in enumerate(items)}
+        selected = sorted(fit_budget(candidates, budget), key=lambda c: (order[c[0]], c[1]))
+        return "\n".join(f"[{key} #{chunk_id}]\n{text}\n" for key, chunk_id, text in selected)
+
+    def _get_agent(self, session_id: str) -> Agent:
+        """The session's agent, created in this process by its first LLM call."""
+        agent = self.agents.get(session_id)
+        if agent is not None:
+            return agent
+        if session_store.get(session_id) is None:
             raise ValueError(
                 f"No agent found for session: {session_id}\n"
                 f"Available sessions: {list(self.agents.keys())}\n"
-                f"Did you forget to create the agent first?"
+                f"Did you forget to create the session first?"
             )
-        
-        try:
-            agent = self.agents[session_id]
-            
-            full_prompt = prompt
-            if include_context:
-                context = self.get_context(session_id)
-                if context:
-                    full_prompt = f"""Context Information:
+        # Parallel first calls (e.g. a batched /generate) must share one agent
+        with self._agent_lock, span("agent_create"):
+            return self.create_agent(session_id)
+
+    def build_prompt(self, prompt: str, session_id: str, include_context: bool = True,
+                     query: Optional[str] = None, part: Optional[Tuple[int, int]] = None) -> str:
+        if not include_context:
+            return prompt
+        with span("get_context"):
+            context = self.get_context(session_id, prompt if query is None else query, part)
+        if not context:
+            return prompt
+        return f"""Context Information:
 {context}
 
 {prompt}"""
+
+    @staticmethod
+    def system_prompt(agent: Agent) -> str:
+        return f"You are {agent.role}.\n{agent.backstory}\n\nYour personal goal is: {agent.goal}"
+
+    def build_messages(self, agent: Agent, full_prompt: str) -> list:
+        return [SystemMessage(content=self.system_prompt(agent)), HumanMessage(content=full_prompt)]
+
+    def run_agent(self, prompt: str, session_id: str, include_context: bool = True,
+                  query: Optional[str] = None, part: Optional[Tuple[int, int]] = None,
+                  fast_path: bool = False) -> str:
+        """Run the session's agent; the context is retrieved with query (default: prompt).
+
+        With fast_path the prompt goes straight to the agent's LLM instead of through a
+        one-task Crew, skipping Crew's orchestration loop for this single-agent call.
+        """
+        agent = self._get_agent(session_id)
+        
+        try:
+            full_prompt = self.build_prompt(prompt, session_id, include_context, query, part)
             
-            print(f"Running agent for session: {session_id}")
-            print(f"Prompt preview: {full_prompt[:200]}...")
+            log.debug("agent run", session_id=session_id, prompt_characters=len(full_prompt), fast_path=fast_path)
+
+            if fast_path:
+                # Timed as "llm_call" by the pooled client's LLMCallHandler
+                message = agent.llm.invoke(self.build_messages(agent, full_prompt))
+                response = str(message.content)
+                self._record_usage(session_id, agent, prompt, full_prompt, response, reported_usage(message))
+                log.info("agent response", session_id=session_id, characters=len(response), fast_path=True)
+                return response
             
             task = Task(
                 description=full_prompt,
@@ -104,19 +253,110 @@ class AgentManager:
             crew = Crew(
                 agents=[agent],
                 tasks=[task],
-                verbose=True
+                verbose=Config.CREW_VERBOSE
             )
             
-            result = crew.kickoff()
+            with span("crew_kickoff"), collect_calls() as calls:
+                result = crew.kickoff()
             response = str(result)
+            # Crew returns only the final text; its LLM calls' usage (scaffolding included) comes from
+            # the pooled client's callback, and is estimated if any call did not report it
+            self._record_usage(session_id, agent, prompt, full_prompt, response, total_usage(calls))
             
-            print(f"Agent response length: {len(response)} characters")
+            log.info("agent response", session_id=session_id, characters=len(response), fast_path=False)
             return response
         
-        except Exception as ex:
-            print(f"Error running agent: {str(ex)}")
+        except Exception:
+            log.exception("agent run failed", session_id=session_id)
             raise
 
+    def _record_usage(self, session_id: str, agent: Agent, prompt: str, full_prompt: str, response: str,
+                      reported: Optional[Tuple[int, int]] = None) -> None:
+        prompt_tokens = estimate_tokens(self.system_prompt(agent)) + estimate_tokens(prompt)
+        context_tokens = max(0, estimate_tokens(full_prompt) - estimate_tokens(prompt))
+        completion_tokens = estimate_tokens(response)
+        if reported is not None:
+            # Split the reported input between prompt and context as the estimates do
+            input_tokens, completion_tokens = reported
+            estimated_input = prompt_tokens + context_tokens
+            context_tokens = input_tokens * context_tokens // estimated_input if estimated_input else 0
+            prompt_tokens = input_tokens - context_tokens
+        document = ",".join(self.context_storage.get(session_id, {}).values())
+        token_usage.record(session_id, document, prompt_tokens, context_tokens, completion_tokens, reported is None)
+
+    @asynccontextmanager
+    async def _slots(self, session_id: str) -> AsyncIterator[None]:
+        """Hold one of the session's tenant slots, then one of the global agent slots.
+
+        At most Config.AGENT_MAX_CONCURRENCY runs and streams execute at once overall,
+        and at most Config.TENANT_MAX_CONCURRENCY for any one session.
+        """
+        tenant = self._tenant_slots(session_id)
+        with span("tenant_wait"):
+            await tenant.acquire()
+        try:
+            with span("agent_wait"):
+                await self.agent_slots.acquire()
+            try:
+                yield
+            finally:
+                self.agent_slots.release()
+        finally:
+            tenant.release()
+
+    async def _in_executor(self, fn: Callable, *args):
+        """Run fn(*args) on the agent executor; call while holding _slots()."""
+        submitted = time.perf_counter()
+        
+        def run():
+            record("executor_wait", time.perf_counter() - submitted)
+            return fn(*args)
+        
+        # Carry the request's context (e.g. its metrics labels) into the worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(contextvars.copy_context().run, run))
+
+    async def arun_agent(self, prompt: str, session_id: str, include_context: bool = True,
+                         query: Optional[str] = None, part: Optional[Tuple[int, int]] = None,
+                         fast_path: bool = False) -> str:
+        """Awaitable run_agent, limited as described in _slots()."""
+        async with self._slots(session_id):
+            return await self._in_executor(functools.partial(self.run_agent, prompt, session_id, include_context,
+                                                             query=query, part=part, fast_path=fast_path))
+
+    def _tenant_slots(self, session_id: str) -> asyncio.Semaphore:
+        if session_id not in self.tenant_slots:
+            self.tenant_slots[session_id] = asyncio.Semaphore(Config.TENANT_MAX_CONCURRENCY)
+        return self.tenant_slots[session_id]
+
+    async def astream_agent(self, prompt: str, session_id: str, include_context: bool = True,
+                            query: Optional[str] = None) -> AsyncIterator[str]:
+        """Stream the completion as text deltas.
+
+        Crew cannot stream, so this calls the agent's LLM directly with the agent's
+        role, goal and backstory as the system prompt. Streams share arun_agent's limits.
+        """
+        async with self._slots(session_id):
+            # Agent creation and retrieval block, so they run on the executor
+            agent, full_prompt = await self._in_executor(self._prepare_stream, prompt, session_id,
+                                                         include_context, query)
+            
+            log.debug("agent stream", session_id=session_id, prompt_characters=len(full_prompt))
+            completion = []
+            try:
+                with span("llm_stream"):
+                    async for chunk in agent.llm.astream(self.build_messages(agent, full_prompt)):
+                        if chunk.content:
+                            completion.append(chunk.content)
+                            yield chunk.content
+            finally:
+                # Counted even when the client disconnects mid-stream
+                self._record_usage(session_id, agent, prompt, full_prompt, "".join(completion))
+
+    def _prepare_stream(self, prompt: str, session_id: str, include_context: bool,
+                        query: Optional[str]) -> Tuple[Agent, str]:
+        return self._get_agent(session_id), self.build_prompt(prompt, session_id, include_context, query)
+
     def get_agent_info(self, session_id: str) -> Optional[dict]:
         if session_id in self.agents:
             return {
@@ -129,21 +369,41 @@ class AgentManager:
             }
         return {"error": f"No agent found for session: {session_id}"}
 
-    def clean_session(self, session_id: str) -> bool:
+    def unload(self, session_id: str, evict_cached: bool = False) -> bool:
+        """Free this process's agent, texts and indexes for a session, keeping what is in session_store.
+
+        With evict_cached, documents no other loaded session uses are also dropped from pdf_cache.
+        """
         found = False
         
-        if session_id in self.agents:
-            print(f"Deleting agent for session: {session_id}")
-            del self.agents[session_id]
+        if self.agents.pop(session_id, None) is not None:
             found = True
         
-        if session_id in self.context_storage:
-            print(f"Deleting context for session: {session_id}")
-            del self.context_storage[session_id]
+        with self._lock:
+            contexts = self.context_storage.pop(session_id, None)
+            self.indexes.pop(session_id, None)
+            for handle in (contexts or {}).values():
+                self._release_handle(handle)
+            unused = [handle for handle in (contexts or {}).values() if handle not in self.handle_refs]
+        
+        if contexts is not None:
             found = True
+        if evict_cached:
+            for handle in unused:
+                pdf_cache.discard(handle)
+        
+        self.tenant_slots.pop(session_id, None)
+        if found:
+            log.info("session unloaded", session_id=session_id)
+        return found
+
+    def clean_session(self, session_id: str) -> bool:
+        found = self.unload(session_id)
+        session_store.delete_contexts(session_id)
+        token_usage.forget(session_id)
         
         if not found:
-            print(f"No data found for session: {session_id}")
+            log.debug("no data to clean", session_id=session_id)
         
         return found
 
@@ -154,7 +414,10 @@ class AgentManager:
         return {
             "total_agents": len(self.agents),
             "total_contexts": len(self.context_storage),
-            "active_sessions": self.get_active_sessions()
+            "context_blobs": blob_store.get_stats(),
+            "llm_pool": llm_pool.get_stats(),
+            "token_usage": token_usage.get_stats(),
+            "active_sessions": [session_label(session_id) for session_id in self.get_active_sessions()]
         }
 
 
@@ -0,0 +1,133 @@
+import threading
+import zlib
+import numpy as np
+from typing import Dict, List, Optional, Set, Tuple
+from config import Config
+from utils.retrieval import STOPWORDS, tokenize
+
+_PRIME = np.uint64((1 << 61) - 1)
+
+# Question phrasing shared by generated questions on unrelated topics ("which of the
+# following best describes the role of ..."); only the remaining content words are compared
+TEMPLATE_WORDS = frozenset("""
+about according answer best called choose definition define describe described describes
+explain following function functions given identify known main most option options primary
+purpose refer referred refers role select statement statements term terms used
+""".split())
+
+
+def content_words(text: str) -> List[str]:
+    """Lowercased words of text without stopwords or template words, plural "s" stripped."""
+    words = []
+    for word in tokenize(text):
+        if word in STOPWORDS or word in TEMPLATE_WORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def question_stem(question) -> str:
+    """The text a question is compared by: its "question" field, or the item itself."""
+    if isinstance(question, dict):
+        question = question.get("question", "")
+    return " ".join(str(question).lower().split())
+
+
+class MinHasher:
+    """MinHash signatures over content-word unigrams and bigrams with LSH banding."""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        # a, b < 2**32 keep (hash * a + b) within uint64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        words = content_words(text)
+        shingles = set(words)
+        shingles.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+        if not shingles:
+            return None
+        hashes = np.fromiter((zlib.crc32(shingle.encode()) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        return ((hashes[:, None] * self.a + self.b) % _PRIME).min(axis=0)
+
+    def band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+
+class SeenQuestions:
+    """LSH index of the questions already served to one session."""
+
+    def __init__(self):
+        self.stems: Set[str] = set()
+        self.signatures: List[np.ndarray] = []
+        self.buckets: Dict[Tuple[int, bytes], List[int]] = {}
+        self.messages_seen = 0
+
+
+class QuestionDeduplicator:
+    """Drops generated questions whose stems nearly match ones already served to a session.
+
+    Served questions are recorded in the session's messages list; each session's LSH
+    index is built from it incrementally, so checking a question costs one signature
+    and a handful of bucket lookups regardless of how many were served before.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.threshold = Config.DEDUP_THRESHOLD if threshold is None else threshold
+        self.hasher = MinHasher()
+        self.sessions: Dict[str, SeenQuestions] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, seen: SeenQuestions, stem: str, signature: Optional[np.ndarray]) -> None:
+        seen.stems.add(stem)
+        if signature is None:
+            return
+        seen.signatures.append(signature)
+        for key in self.hasher.band_keys(signature):
+            seen.buckets.setdefault(key, []).append(len(seen.signatures) - 1)
+
+    def _is_duplicate(self, seen: SeenQuestions, stem: str, signature: Optional[np.ndarray]) -> bool:
+        if stem in seen.stems:
+            return True
+        if signature is None:
+            return False
+        candidates = set()
+        for key in self.hasher.band_keys(signature):
+            candidates.update(seen.buckets.get(key, ()))
+        return any(np.mean(seen.signatures[i] == signature) >= self.threshold for i in candidates)
+
+    def _sync(self, chat_id: str, messages: list) -> SeenQuestions:
+        seen = self.sessions.setdefault(chat_id, SeenQuestions())
+        for message in messages[seen.messages_seen:]:
+            for stem in message.get("questions", ()):
+                if stem not in seen.stems:
+                    self._add(seen, stem, self.hasher.signature(stem))
+        seen.messages_seen = len(messages)
+        return seen
+
+    def filter(self, chat_id: str, questions: list, messages: list) -> Tuple[list, int]:
+        """Return (kept questions, number dropped); kept ones also dedupe each other."""
+        with self._lock:
+            seen = self._sync(chat_id, messages)
+            kept = []
+            for question in questions:
+                stem = question_stem(question)
+                signature = self.hasher.signature(stem)
+                if self._is_duplicate(seen, stem, signature):
+                    continue
+                self._add(seen, stem, signature)
+                kept.append(question)
+            return kept, len(questions) - len(kept)
+
+    def forget(self, chat_id: str) -> None:
+        self.sessions.pop(chat_id, None)
+
+
+question_dedup = QuestionDeduplicator()
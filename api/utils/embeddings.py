@@ -0,0 +1,75 @@
+import zlib
+import numpy as np
+from typing import List, Optional, Tuple
+from config import Config
+from utils.log import get_logger
+from utils.retrieval import ChunkIndex, tokenize
+
+
+class HashingEmbedder:
+    """Signed feature-hashing bag of words; deterministic and needs no model download."""
+
+    def __init__(self, dim: Optional[int] = None):
+        self.dim = dim or Config.EMBEDDING_DIM
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                h = zlib.crc32(term.encode())
+                matrix[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class SentenceTransformerEmbedder:
+    """Local CPU sentence-transformers model (optional dependency)."""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        if Config.EMBEDDING_MODEL == "hashing":
+            _embedder = HashingEmbedder()
+        else:
+            try:
+                _embedder = SentenceTransformerEmbedder(Config.EMBEDDING_MODEL)
+            except ImportError:
+                get_logger("embeddings").warning("sentence-transformers is not installed, using the hashing embedder",
+                                                 model=Config.EMBEDDING_MODEL)
+                _embedder = HashingEmbedder()
+    return _embedder
+
+
+class VectorIndex(ChunkIndex):
+    """Chunks embedded once into a contiguous float32 matrix of unit vectors."""
+
+    def __init__(self, chunks: List[str], embedder=None):
+        super().__init__(chunks)
+        self.embedder = embedder or get_embedder()
+        if chunks:
+            self.matrix = np.ascontiguousarray(self.embedder.embed(chunks), dtype=np.float32)
+        else:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        if not self.chunks or not query.strip():
+            return []
+        query_vector = self.embedder.embed([query])[0]
+        # Cosine similarity of every chunk in one matrix-vector product
+        scores = self.matrix @ query_vector
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+import numpy as np
+from config import Config
+from utils.embeddings import get_embedder
+from utils.retrieval import STOPWORDS, tokenize
+
+# Retrieval's stopwords except the connectives and modals that change what an answer
+# claims: "osmosis and diffusion" must not match "osmosis or diffusion"
+GRADING_STOPWORDS = STOPWORDS - frozenset("""
+and but can could how if may might or should than then what when where which who whom
+why will would
+""".split())
+
+
+def normalize_answer(text: str) -> str:
+    """Lowercase words of text without punctuation, extra whitespace or grading stopwords."""
+    return " ".join(word for word in tokenize(text) if word not in GRADING_STOPWORDS)
+
+
+class GradedAnswers:
+    """Grades given for one question, keyed by normalized answer (LRU, bounded)."""
+
+    def __init__(self):
+        self.grades: "OrderedDict[str, Any]" = OrderedDict()
+        self.vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+
+class GradingCache:
+    """Reuses grades of previously checked answers that normalize to the same text.
+
+    With GRADING_CACHE_SIMILARITY above 0 an answer also matches a graded one whose
+    embedding has at least that cosine similarity to it; get and set then run the
+    embedding model, so async callers run them in a thread.
+    """
+
+    def __init__(self, max_questions: Optional[int] = None, max_answers: Optional[int] = None,
+                 similarity: Optional[float] = None):
+        self.max_questions = max_questions or Config.GRADING_CACHE_MAX_QUESTIONS
+        self.max_answers = max_answers or Config.GRADING_CACHE_MAX_ANSWERS
+        self.similarity = Config.GRADING_CACHE_SIMILARITY if similarity is None else similarity
+        self.questions: "OrderedDict[Tuple[str, str], GradedAnswers]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, answer: str) -> np.ndarray:
+        return get_embedder().embed([answer])[0]
+
+    def get(self, fingerprint: str, question: str, answer: str) -> Optional[Any]:
+        key = (fingerprint, normalize_answer(question))
+        answer = normalize_answer(answer)
+        vector = self._embed(answer) if self.similarity > 0 and answer else None
+        with self._lock:
+            graded = self.questions.get(key)
+            grade = None
+            if graded is not None:
+                self.questions.move_to_end(key)
+                grade = graded.grades.get(answer)
+                if grade is None and vector is not None and graded.vectors:
+                    answers = list(graded.vectors)
+                    scores = np.stack(list(graded.vectors.values())) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity:
+                        answer = answers[best]
+                        grade = graded.grades[answer]
+                if grade is not None:
+                    graded.grades.move_to_end(answer)
+            if grade is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return grade
+
+    def set(self, fingerprint: str, question: str, answer: str, grade: Any) -> None:
+        key = (fingerprint, normalize_answer(question))
+        answer = normalize_answer(answer)
+        vector = self._embed(answer) if self.similarity > 0 and answer else None
+        with self._lock:
+            graded = self.questions.get(key)
+            if graded is None:
+                graded = self.questions[key] = GradedAnswers()
+                while len(self.questions) > self.max_questions:
+                    self.questions.popitem(last=False)
+            self.questions.move_to_end(key)
+            graded.grades[answer] = grade
+            graded.grades.move_to_end(answer)
+            if vector is not None:
+                graded.vectors[answer] = vector
+            while len(graded.grades) > self.max_answers:
+                evicted, _ = graded.grades.popitem(last=False)
+                graded.vectors.pop(evicted, None)
+
+    def get_stats(self) -> dict:
+        return {
+            "questions": len(self.questions),
+            "answers": sum(len(graded.grades) for graded in self.questions.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+grading_cache = GradingCache()
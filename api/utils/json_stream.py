@@ -0,0 +1,222 @@
+import json
+import re
+from typing import Any, List, Optional
+
+_ROOT = re.compile(r"[{\[]")
+_OUTSIDE = re.compile(r"[\"'{}\[\],:]|[A-Za-z_]+")
+_IN_STRING = re.compile(r'["\\]')
+_RUNS = re.compile(r"\s+|\S+")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class JSONItemStream:
+    """Single-pass, incremental and tolerant JSON parser for LLM output.
+
+    Text is fed in chunks as it streams. The outermost object/array is located (any
+    preamble such as a code fence is skipped, as is anything after it) and rewritten
+    on the fly into valid JSON, repairing the usual LLM defects: single-quoted
+    strings, trailing or doubled commas, missing commas between values, Python
+    True/False/None literals, mismatched closing brackets and, on close(), a
+    truncated tail. Every character is examined a bounded number of times.
+
+    feed() returns the items of the item array as soon as each one closes. The item
+    array is the outermost array, or the first array directly inside the outermost
+    object (e.g. the list in {"mcqs": [...]}). close() returns the whole value.
+    """
+
+    def __init__(self):
+        self.out: List[str] = []  # repaired JSON text
+        self.stack: List[str] = []
+        self.string: Optional[str] = None  # quote char of the string being scanned
+        self.escape = False
+        self.quote_pending = False  # "'" seen in a single-quoted string: closing quote or apostrophe?
+        self.pending_space: List[str] = []
+        self.comma_pending = False
+        self.after_value = False
+        self.bare = False  # the output ends in a bare value (number, literal) that more characters extend
+        self.done = False
+        self.carry = ""  # trailing partial bare word, completed by the next chunk
+        self.items_level: Optional[int] = None  # stack depth of the item array
+        self.item_start: Optional[int] = None  # index in out where the current item began
+        self.ready: List[Any] = []
+
+    def feed(self, chunk: str, final: bool = False) -> List[Any]:
+        """Consume the next piece of text and return the items it completed."""
+        text = self.carry + chunk
+        self.carry = ""
+        pos, length = 0, len(text)
+        while pos < length and not self.done:
+            if not self.stack:
+                match = _ROOT.search(text, pos)
+                if match is None:
+                    break
+                self._open(match.group())
+                pos = match.end()
+            elif self.string == '"':
+                pos = self._scan_double(text, pos, length)
+            elif self.string == "'":
+                pos = self._scan_single(text, pos, length)
+            else:
+                pos = self._scan_outside(text, pos, length, final)
+        items, self.ready = self.ready, []
+        return items
+
+    def close(self) -> Any:
+        """Finish the stream, closing anything left open, and return the parsed value."""
+        self.feed("", final=True)
+        if not self.out:
+            raise ValueError("No JSON object or array found")
+        if self.string == "'" and self.quote_pending:
+            self.out.append('"')
+            self.out.extend(self.pending_space)
+        elif self.string is not None:
+            self.out.append('\\"' if self.escape else '"')
+        self.string = None
+        while self.stack:
+            self.out.append("}" if self.stack.pop() == "{" else "]")
+        return json.loads("".join(self.out), strict=False)
+
+    def _value_start(self, may_need_comma: bool) -> None:
+        if self.comma_pending:
+            self.out.append(",")
+            self.comma_pending = False
+        elif self.after_value and may_need_comma:
+            self.out.append(",")
+        self.after_value = False
+
+    def _open(self, char: str) -> None:
+        self.stack.append(char)
+        depth = len(self.stack)
+        if self.items_level is None and char == "[" and depth <= 2:
+            self.items_level = depth
+        elif self.items_level is not None and depth == self.items_level + 1 and self.item_start is None:
+            self.item_start = len(self.out)
+        self.out.append(char)
+
+    def _close(self) -> None:
+        self.comma_pending = False
+        self.out.append("}" if self.stack.pop() == "{" else "]")
+        self.after_value = True
+        depth = len(self.stack)
+        if self.item_start is not None and depth == self.items_level:
+            try:
+                self.ready.append(json.loads("".join(self.out[self.item_start:]), strict=False))
+            except ValueError:
+                pass  # left for close() to report
+            self.item_start = None
+        elif self.items_level is not None and depth < self.items_level:
+            self.items_level = -1  # the item array is closed; ignore later arrays
+        if not self.stack:
+            self.done = True
+
+    def _scan_outside(self, text: str, pos: int, length: int, final: bool) -> int:
+        match = _OUTSIDE.search(text, pos)
+        end = match.start() if match else length
+        if end > pos:
+            # Numbers (or other bare values) between tokens; whitespace separates two of them
+            for run in _RUNS.findall(text, pos, end):
+                if run[0].isspace():
+                    self.bare = False
+                elif not self.bare:
+                    self._value_start(True)
+                    self.after_value = True
+                    self.bare = True
+                self.out.append(run)
+        if match is None:
+            return length
+
+        token = match.group()
+        bare, self.bare = self.bare, False
+        if token in "{[":
+            self._value_start(True)
+            self._open(token)
+        elif token in "}]":
+            self._close()
+        elif token == ",":
+            self.comma_pending = self.after_value or self.comma_pending
+            self.after_value = False
+        elif token == ":":
+            self.comma_pending = False
+            self.after_value = False
+            self.out.append(":")
+        elif token in "\"'":
+            self._value_start(True)
+            self.string = token
+            self.out.append('"')
+        else:
+            if match.end() == length and not final:
+                self.carry = token
+                self.bare = bare
+                return length
+            if bare:
+                # Part of a bare value, like the "e" of 1e5
+                self.out.append(token)
+            else:
+                self._value_start(True)
+                self.out.append(_PY_LITERALS.get(token, token))
+                self.after_value = True
+            self.bare = True
+        return match.end()
+
+    def _scan_double(self, text: str, pos: int, length: int) -> int:
+        if self.escape:
+            self.escape = False
+            self.out.append(text[pos])
+            return pos + 1
+        match = _IN_STRING.search(text, pos)
+        if match is None:
+            self.out.append(text[pos:])
+            return length
+        self.out.append(text[pos:match.end()])
+        if match.group() == "\\":
+            self.escape = True
+        else:
+            self.string = None
+            self.after_value = True
+        return match.end()
+
+    def _scan_single(self, text: str, pos: int, length: int) -> int:
+        out = self.out
+        while pos < length:
+            char = text[pos]
+            if self.quote_pending:
+                if char.isspace():
+                    self.pending_space.append(char)
+                    pos += 1
+                    continue
+                self.quote_pending = False
+                if char in ",:}]":
+                    # It was the closing quote
+                    out.append('"')
+                    out.extend(self.pending_space)
+                    self.pending_space = []
+                    self.string = None
+                    self.after_value = True
+                    return pos
+                out.append("'")
+                out.extend(self.pending_space)
+                self.pending_space = []
+                continue
+            if self.escape:
+                self.escape = False
+                out.append("'" if char == "'" else "\\" + char)
+            elif char == "\\":
+                self.escape = True
+            elif char == "'":
+                self.quote_pending = True
+            elif char == '"':
+                out.append('\\"')
+            else:
+                out.append(char)
+            pos += 1
+        return pos
+
+
+def parse_json(text: str) -> Any:
+    """Parse possibly malformed JSON from an LLM response."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        parser = JSONItemStream()
+        parser.feed(text)
+        return parser.close()
@@ -0,0 +1,131 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_google_genai import ChatGoogleGenerativeAI
+from config import Config
+from utils.metrics import record
+from utils.token_usage import reported_usage
+
+# Usage reported by each LLM call made inside collect_calls() (None where a call reported none)
+_calls: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("llm_calls", default=None)
+
+
+def create_gemini_client():
+    return ChatGoogleGenerativeAI(
+        model=Config.LLM_MODEL,
+        google_api_key=Config.API_KEY,
+        temperature=Config.LLM_TEMPERATURE,
+        convert_system_message_to_human=True
+    )
+
+
+class LLMCallHandler(BaseCallbackHandler):
+    """Times every call made through a pooled client as the "llm_call" stage.
+
+    This also covers the calls Crew makes on an agent's behalf, which run_agent
+    cannot time (or read the usage of) from outside crew.kickoff().
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.started: Dict[UUID, float] = {}
+
+    def on_llm_start(self, serialized: dict, prompts: list, *, run_id: UUID, **kwargs) -> None:
+        self.started[run_id] = time.perf_counter()
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs) -> None:
+        self.started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id)
+        calls = _calls.get()
+        if calls is not None:
+            usages = [reported_usage(getattr(generation, "message", None))
+                      for generations in response.generations for generation in generations]
+            if usages and None not in usages:
+                calls.append((sum(usage[0] for usage in usages), sum(usage[1] for usage in usages)))
+            else:
+                calls.append(None)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._finish(run_id)
+
+    def _finish(self, run_id: UUID) -> None:
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            record("llm_call", time.perf_counter() - started)
+
+
+llm_call_handler = LLMCallHandler()
+
+
+@contextmanager
+def collect_calls() -> Iterator[list]:
+    """Collect the reported usage of the pooled clients' calls made in this context."""
+    calls = []
+    token = _calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _calls.reset(token)
+
+
+def total_usage(calls: list) -> Optional[Tuple[int, int]]:
+    """Summed (input, output) tokens of collected calls; None unless every call reported its usage."""
+    if not calls or None in calls:
+        return None
+    return sum(call[0] for call in calls), sum(call[1] for call in calls)
+
+
+class LLMPool:
+    """A fixed set of shared LLM clients handed out round-robin to every agent.
+
+    The clients are stateless between calls, so sessions can share them and reuse
+    their open connections instead of each building a client (and handshake) of its own.
+    """
+
+    def __init__(self, size: Optional[int] = None, factory: Optional[Callable] = None):
+        self.size = max(1, size or Config.LLM_POOL_SIZE)
+        self.factory = factory or create_gemini_client
+        self.clients: List = []
+        self.hits = 0
+        self.misses = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if len(self.clients) < self.size:
+                client = self.factory()
+                client.callbacks = [*(getattr(client, "callbacks", None) or []), llm_call_handler]
+                self.clients.append(client)
+                self.misses += 1
+                return client
+            client = self.clients[self._next % self.size]
+            self._next += 1
+            self.hits += 1
+            return client
+
+    def reset(self, factory: Optional[Callable] = None) -> None:
+        """Drop the pooled clients, optionally switching to a different client factory."""
+        with self._lock:
+            self.clients = []
+            self._next = 0
+            if factory is not None:
+                self.factory = factory
+
+    def get_stats(self) -> dict:
+        return {
+            "size": self.size,
+            "clients": len(self.clients),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+llm_pool = LLMPool()
@@ -0,0 +1,97 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import traceback
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from config import Config
+
+_listener: Optional[QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without ever blocking; drops them when the queue is full."""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 3), "level": record.levelname, "logger": record.name,
+                 "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        return f"{self.formatTime(record)} {record.levelname} {record.name}: {record.getMessage()} {fields}".rstrip()
+
+
+def _setup() -> None:
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger("quizzai")
+        root.setLevel(Config.LOG_LEVEL.upper())
+        root.propagate = False
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JSONFormatter() if Config.LOG_FORMAT == "json" else TextFormatter())
+        records: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        root.addHandler(_DroppingQueueHandler(records))
+        _listener = QueueListener(records, stream)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class StructuredLogger:
+    """Logs an event name plus key=value fields; formatting and writing happen on a background thread.
+
+    DEBUG and INFO events are kept with probability Config.LOG_SAMPLE_RATE; warnings
+    and errors are always kept.
+    """
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, event: str, fields: dict) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        if level < logging.WARNING and Config.LOG_SAMPLE_RATE < 1.0 and random.random() >= Config.LOG_SAMPLE_RATE:
+            return
+        self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event: str, **fields) -> None:
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields) -> None:
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields) -> None:
+        self._log(logging.ERROR, event, fields)
+
+    def exception(self, event: str, **fields) -> None:
+        """Log an error with the traceback of the exception being handled."""
+        fields["traceback"] = traceback.format_exc()
+        self._log(logging.ERROR, event, fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    _setup()
+    return StructuredLogger(logging.getLogger(f"quizzai.{name}"))
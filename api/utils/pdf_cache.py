@@ -0,0 +1,116 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from config import Config
+from utils.metrics import span
+from utils.pdf_parser import PdfSource, extract_text
+from utils.retrieval import ChunkIndex, build_index
+
+
+class CachedDocument:
+    """Extracted text and retrieval index of one PDF, keyed by the SHA-256 of its bytes."""
+
+    def __init__(self, digest: str, text: str, index: ChunkIndex):
+        self.digest = digest
+        self.text = text
+        self.index = index
+        self.size = len(text) + index.size()
+
+
+class PdfCache:
+    """LRU cache of processed documents shared by every session, bounded in entries and bytes."""
+
+    def __init__(self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries or Config.PDF_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or Config.PDF_CACHE_MAX_BYTES
+        self.documents: "OrderedDict[str, CachedDocument]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        # digest -> lock held while that document is extracted and indexed
+        self._loading: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, digest: str) -> Optional[CachedDocument]:
+        with self._lock:
+            return self._lookup(digest, miss=True)
+
+    def put(self, digest: str, text: str) -> CachedDocument:
+        """Index and cache text; if the digest is already cached the existing entry is returned."""
+        return self._build(digest, lambda: text)
+
+    def _build(self, digest: str, read_text: Callable[[], str]) -> CachedDocument:
+        """The cached document for digest, built from read_text() on a miss (counted once per call)."""
+        with self._lock:
+            existing = self._lookup(digest)
+            if existing is not None:
+                return existing
+            loading = self._loading.setdefault(digest, threading.Lock())
+        # Concurrent misses on one digest wait for the first to extract and index it, then hit
+        with loading:
+            try:
+                with self._lock:
+                    existing = self._lookup(digest, miss=True)
+                    if existing is not None:
+                        return existing
+                text = read_text()
+                with span("pdf_index"):
+                    document = CachedDocument(digest, text, build_index(text))
+                self._add(document)
+                return document
+            finally:
+                with self._lock:
+                    if self._loading.get(digest) is loading:
+                        del self._loading[digest]
+
+    def _lookup(self, digest: str, miss: bool = False) -> Optional[CachedDocument]:
+        # Call with self._lock held; a hit is always counted, a miss only if asked to
+        document = self.documents.get(digest)
+        if document is not None:
+            self.documents.move_to_end(digest)
+            self.hits += 1
+        elif miss:
+            self.misses += 1
+        return document
+
+    def _add(self, document: CachedDocument) -> None:
+        with self._lock:
+            digest = document.digest
+            self.documents[digest] = document
+            self.total_bytes += document.size
+            while len(self.documents) > 1 and (
+                len(self.documents) > self.max_entries or self.total_bytes > self.max_bytes
+            ):
+                _, evicted = self.documents.popitem(last=False)
+                self.total_bytes -= evicted.size
+
+    def discard(self, digest: str) -> None:
+        with self._lock:
+            document = self.documents.pop(digest, None)
+            if document is not None:
+                self.total_bytes -= document.size
+
+    def entries(self) -> List[CachedDocument]:
+        with self._lock:
+            return list(self.documents.values())
+
+    def load(self, source: PdfSource, digest: Optional[str] = None) -> CachedDocument:
+        """Return the cached document for source, extracting and indexing it on a miss.
+
+        digest must be given when source is a path; for bytes it is computed here.
+        """
+        if digest is None:
+            digest = hashlib.sha256(source).hexdigest()
+        return self._build(digest, lambda: extract_text(source))
+
+    def get_stats(self) -> dict:
+        return {
+            "documents": len(self.documents),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+pdf_cache = PdfCache()
@@ -1,8 +1,144 @@
 import fitz
-def extract_text(filepath):
-    doc = fitz.open(filepath)
-    text=""
-    for page in doc:
-        text+=page.get_text()
+import hashlib
+import multiprocessing
+import multiprocessing.util
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+from config import Config
+from utils.metrics import span
+
+# A filesystem path or the raw bytes of a PDF
+PdfSource = Union[str, bytes]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_unavailable = False
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    """Lazily start the shared extraction pool; None when processes are unavailable."""
+    global _pool, _pool_unavailable
+    if _pool is not None or _pool_unavailable or Config.PDF_WORKERS <= 1:
+        return _pool
+    with _pool_lock:
+        if _pool is not None or _pool_unavailable:
+            return _pool
+        try:
+            # Never fork the (multi-threaded) server; forkserver/spawn workers start clean
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pool = ProcessPoolExecutor(max_workers=Config.PDF_WORKERS,
+                                        mp_context=multiprocessing.get_context(method))
+            # Runs before multiprocessing's exit handler joins child processes, also in
+            # multiprocessing children (e.g. uvicorn workers), which skip atexit. It must
+            # outrank the pool queues' own finalizers (10), which close them to new items
+            multiprocessing.util.Finalize(None, shutdown, exitpriority=100)
+        except (OSError, NotImplementedError, ValueError):
+            # Serverless runtimes (e.g. Vercel) have no working multiprocessing
+            _pool_unavailable = True
+    return _pool
+
+
+def shutdown() -> None:
+    """Stop the extraction pool's workers; the next large extraction starts a new pool.
+
+    Called on app shutdown and at process exit, where idle workers would otherwise
+    keep the process waiting on them forever.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _forget_pool() -> None:
+    # A forked child inherits the pool object but none of its threads or workers, and
+    # the lock as it was, possibly held by a thread that does not exist in the child
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_pool)
+
+
+def _open(source: PdfSource) -> fitz.Document:
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def _page_ranges(page_count: int, in_memory: bool) -> List[Tuple[int, int]]:
+    step = max(1, Config.PDF_PAGES_PER_TASK)
+    if in_memory:
+        # Every task pickles the whole buffer, so keep it to one range per worker
+        step = max(step, -(-page_count // Config.PDF_WORKERS))
+    return [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+
+def _extract_range(source: PdfSource, start: int, stop: int) -> List[str]:
+    doc = _open(source)
+    try:
+        return [doc[page_no].get_text() for page_no in range(start, stop)]
+    finally:
+        doc.close()
+
+
+def iter_pages(source: PdfSource) -> Iterator[Tuple[int, str]]:
+    """Yield (page_no, text) in page order, page_no being the zero-based fitz index.
+
+    Large documents are split into page ranges decoded on the process pool, so the
+    first pages are available while later ranges are still being extracted.
+    """
+    doc = _open(source)
+    page_count = doc.page_count
+    pool = _get_pool() if page_count >= Config.PDF_PARALLEL_MIN_PAGES else None
+
+    if pool is None:
+        try:
+            for page in doc:
+                yield page.number, page.get_text()
+        finally:
+            doc.close()
+        return
+
     doc.close()
-    return text    
\ No newline at end of file
+    ranges = _page_ranges(page_count, in_memory=not isinstance(source, str))
+    futures = [pool.submit(_extract_range, source, start, stop) for start, stop in ranges]
+    try:
+        for (start, _), future in zip(ranges, futures):
+            for offset, text in enumerate(future.result()):
+                yield start + offset, text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def extract_text(source: PdfSource) -> str:
+    with span("pdf_extract"):
+        return "".join(text for _, text in iter_pages(source))
+
+
+def spool_to_tempfile(stream: BinaryIO) -> Tuple[str, str]:
+    """Copy a PDF too large to hold in memory to disk, returning (path, sha256 hex digest).
+
+    The stream is copied in fixed-size blocks to a uniquely named file in the system
+    temp directory, which MuPDF then reads lazily page by page. The caller removes it.
+    """
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f, span("pdf_spool"):
+            while True:
+                block = stream.read(Config.PDF_SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                f.write(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
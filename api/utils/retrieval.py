@@ -0,0 +1,132 @@
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config import Config
+
+_TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i
+if in into is it its may might of on or should so than that the their them then there
+these they this to was were what when where which who whom why will with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (~4 characters per token for English prose)."""
+    return (len(text) + 3) // 4
+
+
+def chunk_text(text: str, chunk_size: Optional[int] = None, overlap: Optional[int] = None) -> List[str]:
+    """Split text into ~chunk_size character chunks that end on whitespace."""
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    overlap = Config.CHUNK_OVERLAP if overlap is None else overlap
+    chunks = []
+    start, length = 0, len(text)
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            split = max(text.rfind(" ", start + chunk_size // 2, end),
+                        text.rfind("\n", start + chunk_size // 2, end))
+            if split > start:
+                end = split
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= length:
+            break
+        next_start = end - overlap
+        if next_start > start:
+            # Restart the overlap on a word boundary
+            space = text.find(" ", next_start, end)
+            start = space + 1 if space != -1 else next_start
+        else:
+            start = end
+    return chunks
+
+
+class ChunkIndex:
+    """A searchable, fixed list of text chunks."""
+
+    def __init__(self, chunks: List[str]):
+        self.chunks = chunks
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def size(self) -> int:
+        """Approximate bytes held: the chunk text, plus the embedding matrix of dense indexes."""
+        matrix = getattr(self, "matrix", None)
+        return sum(len(chunk) for chunk in self.chunks) + (matrix.nbytes if matrix is not None else 0)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Return up to k (chunk_id, score) pairs with a positive score, best first."""
+        raise NotImplementedError
+
+
+class BM25Index(ChunkIndex):
+    """Okapi BM25 over a fixed list of chunks, stored as per-term posting lists."""
+
+    def __init__(self, chunks: List[str], k1: float = 1.5, b: float = 0.75):
+        super().__init__(chunks)
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.lengths: List[int] = []
+        for chunk_id, chunk in enumerate(chunks):
+            terms = tokenize(chunk)
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, []).append((chunk_id, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        n = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in postings:
+                norm = 1 - self.b + self.b * self.lengths[chunk_id] / self.avg_length
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def build_index(text: str) -> ChunkIndex:
+    """Chunk text and index it with the retriever selected by Config.RETRIEVAL_MODE."""
+    chunks = chunk_text(text)
+    if Config.RETRIEVAL_MODE == "dense":
+        from utils.embeddings import VectorIndex, get_embedder
+        return VectorIndex(chunks, get_embedder())
+    return BM25Index(chunks)
+
+
+def spread(items: list, budget: int) -> list:
+    """Pick evenly spaced items so that a budget-sized sample covers the whole list."""
+    if not items:
+        return []
+    avg_tokens = max(1, sum(estimate_tokens(text) for *_, text in items) // len(items))
+    count = max(1, min(len(items), budget // avg_tokens))
+    step = len(items) / count
+    return [items[int(i * step)] for i in range(count)]
+
+
+def fit_budget(candidates: list, budget: int) -> list:
+    """Keep candidates, in priority order, whose text fits within the token budget."""
+    selected, used = [], 0
+    for candidate in candidates:
+        tokens = estimate_tokens(candidate[-1])
+        if used + tokens > budget:
+            continue
+        selected.append(candidate)
+        used += tokens
+    return selected
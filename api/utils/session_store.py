@@ -0,0 +1,285 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from config import Config
+from utils.blob_store import blob_store
+
+
+def isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+def session_label(chat_id: str) -> str:
+    """A stable, non-reversible name for a session in stats; the chat_id itself grants access to it."""
+    return hashlib.sha256(chat_id.encode()).hexdigest()[:12]
+
+
+def _timestamp(value) -> float:
+    # Records written before timestamps were epoch floats hold ISO strings
+    return datetime.fromisoformat(value).timestamp() if isinstance(value, str) else value
+
+
+class SessionRecord:
+    """One session: plain slots, epoch-float timestamps and the PDF text held by blob handle."""
+
+    __slots__ = ("chat_id", "pdf_blob", "pdf_filename", "pdf_hash", "processed", "messages",
+                 "created_at", "updated_at")
+
+    def __init__(self, chat_id: str, pdf_blob: Optional[str] = None, pdf_filename: Optional[str] = None,
+                 pdf_hash: Optional[str] = None, processed: bool = False, messages: Optional[list] = None,
+                 created_at: Optional[float] = None, updated_at: Optional[float] = None):
+        now = time.time()
+        self.chat_id = chat_id
+        self.pdf_blob = pdf_blob  # blob handle of the extracted text
+        self.pdf_filename = pdf_filename
+        self.pdf_hash = pdf_hash  # SHA-256 of the PDF, key into utils.pdf_cache
+        self.processed = processed
+        self.messages = [] if messages is None else messages  # each with an epoch "timestamp"
+        self.created_at = now if created_at is None else created_at
+        self.updated_at = now if updated_at is None else updated_at
+
+    @property
+    def crew_session_id(self) -> str:
+        return self.chat_id
+
+    def to_dict(self) -> dict:
+        """The stored form, as JSON-compatible values."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SessionRecord":
+        data = {name: data.get(name) for name in cls.__slots__}
+        data["created_at"] = _timestamp(data["created_at"])
+        data["updated_at"] = _timestamp(data["updated_at"])
+        data["processed"] = bool(data["processed"])
+        for message in data["messages"] or ():
+            message["timestamp"] = _timestamp(message.get("timestamp"))
+        return cls(**data)
+
+    def export(self) -> dict:
+        """The session in the API's JSON shape, minus the PDF text."""
+        return {
+            "chat_id": self.chat_id,
+            "crew_session_id": self.crew_session_id,
+            "pdf_filename": self.pdf_filename,
+            "pdf_hash": self.pdf_hash,
+            "processed": self.processed,
+            "messages": [dict(message, timestamp=isoformat(message["timestamp"])) for message in self.messages],
+            "created_at": isoformat(self.created_at),
+            "updated_at": isoformat(self.updated_at)
+        }
+
+
+class MemorySessionStore:
+    """Sessions, context entries and blobs held by this process only."""
+
+    persistent = False
+
+    def __init__(self):
+        self.sessions: Dict[str, SessionRecord] = {}
+        self.contexts: Dict[str, Dict[str, str]] = {}  # session -> context key -> blob handle
+        self.last_used: "OrderedDict[str, float]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: str) -> Optional[SessionRecord]:
+        return self.sessions.get(chat_id)
+
+    def put(self, chat_id: str, session: SessionRecord) -> None:
+        self.sessions[chat_id] = session
+        self.touch(chat_id)
+
+    def touch(self, chat_id: str) -> None:
+        with self._lock:
+            if chat_id in self.sessions:
+                self.last_used[chat_id] = time.time()
+                self.last_used.move_to_end(chat_id)
+
+    def expired(self, cutoff: float, limit: int = 1000) -> List[str]:
+        """Sessions last used before cutoff, least recently used first."""
+        found = []
+        with self._lock:
+            for chat_id, last_used in self.last_used.items():
+                if last_used >= cutoff or len(found) >= limit:
+                    break
+                found.append(chat_id)
+        return found
+
+    def update(self, chat_id: str, mutate: Callable[[SessionRecord], None]) -> bool:
+        with self._lock:
+            session = self.sessions.get(chat_id)
+            if session is None:
+                return False
+            mutate(session)
+            self.last_used[chat_id] = time.time()
+            self.last_used.move_to_end(chat_id)
+            return True
+
+    def delete(self, chat_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            self.last_used.pop(chat_id, None)
+        return self.sessions.pop(chat_id, None)
+
+    def put_blob(self, text: str, key: Optional[str] = None) -> str:
+        return blob_store.intern(text, key)
+
+    def get_blob(self, handle: Optional[str]) -> Optional[str]:
+        return blob_store.get(handle)
+
+    def release_blob(self, handle: Optional[str]) -> None:
+        blob_store.release(handle)
+
+    def set_context(self, session_id: str, key: str, handle: str) -> None:
+        self.contexts.setdefault(session_id, {})[key] = handle
+
+    def get_contexts(self, session_id: str) -> Dict[str, str]:
+        return dict(self.contexts.get(session_id, {}))
+
+    def delete_contexts(self, session_id: str) -> None:
+        for handle in self.contexts.pop(session_id, {}).values():
+            self.release_blob(handle)
+
+
+class SQLiteSessionStore:
+    """Sessions, context entries and reference-counted blobs in a WAL-mode SQLite file.
+
+    Every uvicorn worker on the host opens the same file, so a session created by one
+    worker can be served by any other, and sessions survive restarts.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);"
+            "CREATE TABLE IF NOT EXISTS blobs ("
+            "handle TEXT PRIMARY KEY, text TEXT NOT NULL, refs INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS contexts ("
+            "session_id TEXT NOT NULL, key TEXT NOT NULL, handle TEXT NOT NULL, PRIMARY KEY (session_id, key));"
+        )
+        # When this process last wrote each session's updated_at
+        self.touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, chat_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            row = self.conn.execute("SELECT data FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+            if row is None:
+                # Deleted, possibly by another worker
+                self.touched.pop(chat_id, None)
+        return SessionRecord.from_dict(json.loads(row[0])) if row else None
+
+    def put(self, chat_id: str, session: SessionRecord) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO sessions (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                              (chat_id, json.dumps(session.to_dict()), now))
+            self.touched[chat_id] = now
+
+    def touch(self, chat_id: str) -> None:
+        """Mark the session used; a write, so skipped if this process did so recently."""
+        now = time.time()
+        if now - self.touched.get(chat_id, 0) < Config.SESSION_TOUCH_INTERVAL:
+            return
+        with self._lock:
+            self.touched[chat_id] = now
+            self.conn.execute("UPDATE sessions SET updated_at = ? WHERE chat_id = ?", (now, chat_id))
+
+    def expired(self, cutoff: float, limit: int = 1000) -> List[str]:
+        """Sessions no worker has used since cutoff, least recently used first."""
+        with self._lock:
+            rows = self.conn.execute("SELECT chat_id FROM sessions WHERE updated_at < ? ORDER BY updated_at LIMIT ?",
+                                     (cutoff, limit)).fetchall()
+        return [chat_id for (chat_id,) in rows]
+
+    def update(self, chat_id: str, mutate: Callable[[SessionRecord], None]) -> bool:
+        """Read, mutate and write back a session in one transaction."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute("SELECT data FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+                if row is None:
+                    return False
+                session = SessionRecord.from_dict(json.loads(row[0]))
+                mutate(session)
+                now = time.time()
+                self.conn.execute("UPDATE sessions SET data = ?, updated_at = ? WHERE chat_id = ?",
+                                  (json.dumps(session.to_dict()), now, chat_id))
+                self.touched[chat_id] = now
+                return True
+            finally:
+                self.conn.execute("COMMIT")
+
+    def delete(self, chat_id: str) -> Optional[SessionRecord]:
+        with self._lock:
+            self.touched.pop(chat_id, None)
+            row = self.conn.execute("DELETE FROM sessions WHERE chat_id = ? RETURNING data", (chat_id,)).fetchone()
+        return SessionRecord.from_dict(json.loads(row[0])) if row else None
+
+    def put_blob(self, text: str, key: Optional[str] = None) -> str:
+        handle = key or hashlib.sha256(text.encode()).hexdigest()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO blobs (handle, text, refs) VALUES (?, ?, 1) "
+                "ON CONFLICT (handle) DO UPDATE SET refs = refs + 1",
+                (handle, text)
+            )
+        return handle
+
+    def get_blob(self, handle: Optional[str]) -> Optional[str]:
+        if handle is None:
+            return None
+        with self._lock:
+            row = self.conn.execute("SELECT text FROM blobs WHERE handle = ?", (handle,)).fetchone()
+        return row[0] if row else None
+
+    def release_blob(self, handle: Optional[str]) -> None:
+        if handle is None:
+            return
+        with self._lock:
+            self._release(handle)
+
+    def _release(self, handle: str) -> None:
+        self.conn.execute("UPDATE blobs SET refs = refs - 1 WHERE handle = ?", (handle,))
+        self.conn.execute("DELETE FROM blobs WHERE handle = ? AND refs <= 0", (handle,))
+
+    def set_context(self, session_id: str, key: str, handle: str) -> None:
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO contexts (session_id, key, handle) VALUES (?, ?, ?)",
+                              (session_id, key, handle))
+
+    def get_contexts(self, session_id: str) -> Dict[str, str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT key, handle FROM contexts WHERE session_id = ? ORDER BY rowid",
+                                     (session_id,)).fetchall()
+        return dict(rows)
+
+    def delete_contexts(self, session_id: str) -> None:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.conn.execute("DELETE FROM contexts WHERE session_id = ? RETURNING handle",
+                                         (session_id,)).fetchall()
+                for (handle,) in rows:
+                    self._release(handle)
+            finally:
+                self.conn.execute("COMMIT")
+
+
+def create_session_store():
+    if Config.SESSION_STORE_BACKEND == "sqlite":
+        return SQLiteSessionStore(Config.SESSION_STORE_PATH)
+    return MemorySessionStore()
+
+
+session_store = create_session_store()
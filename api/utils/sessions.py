@@ -1,64 +1,168 @@
 from uuid import uuid4
+from collections import OrderedDict
 from typing import Dict, List, Optional
-from datetime import datetime
+from config import Config
+from utils.blob_store import blob_store
 from utils.crew import agent_maneger
+from utils.dedup import question_dedup
+from utils.log import get_logger
+from utils.pdf_cache import pdf_cache
+from utils.session_store import SessionRecord, session_store
+import threading
+import time
+
+log = get_logger("sessions")
 
 class SessionManager:
-    def __init__(self):
+    def __init__(self, store=None):
       
-        self.sessions: Dict[str, dict] = {}
+        self.store = store or session_store
+        # Sessions used by this process, least recently used first
+        self.recent: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
     
-    def create_session(self) -> tuple[str, dict]:
+    def create_session(self) -> tuple[str, SessionRecord]:
        
         chat_id = str(uuid4())
-        crew_session_id = str(uuid4())
-        agents = agent_maneger.create_agent(chat_id)
-        
-        session_data = {
-            "chat_id": chat_id,
-            "crew_session_id": chat_id,
-            "pdf_text": None,
-            "pdf_filename": None,
-            "processed": False,
-            "messages": [],  # Store chat history
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
+        session = SessionRecord(chat_id)
         
-        self.sessions[chat_id] = session_data
+        self.store.put(chat_id, session)
+        self._touch(chat_id)
     
-        return chat_id, session_data
+        return chat_id, session
     
-    def get_session(self, chat_id: str) -> Optional[dict]:
+    def get_session(self, chat_id: str) -> Optional[SessionRecord]:
        
-        return self.sessions.get(chat_id)
+        session = self.store.get(chat_id)
+        if session is not None:
+            self.store.touch(chat_id)
+            self._touch(chat_id)
+        return session
+
+    def _touch(self, chat_id: str) -> None:
+        with self._lock:
+            self.recent[chat_id] = time.time()
+            self.recent.move_to_end(chat_id)
     
     def update_session(self, chat_id: str, updates: dict) -> bool:
         
-        if chat_id not in self.sessions:
-            return False
+        def apply(session: SessionRecord) -> None:
+            for name, value in updates.items():
+                setattr(session, name, value)
+            session.updated_at = time.time()
+        
+        return self.store.update(chat_id, apply)
+
+    def set_pdf(self, chat_id: str, text: str, pdf_hash: Optional[str] = None,
+                filename: Optional[str] = None) -> bool:
+        """Point the session at an interned copy of the PDF text, releasing any previous one."""
+        handle = self.store.put_blob(text, pdf_hash)
+        previous = []
         
-        self.sessions[chat_id].update(updates)
-        self.sessions[chat_id]["updated_at"] = datetime.now().isoformat()
+        def apply(session: SessionRecord) -> None:
+            previous.append(session.pdf_blob)
+            session.pdf_blob = handle
+            session.pdf_hash = pdf_hash
+            session.processed = True
+            if filename is not None:
+                session.pdf_filename = filename
+            session.updated_at = time.time()
+        
+        if not self.store.update(chat_id, apply):
+            self.store.release_blob(handle)
+            return False
+        self.store.release_blob(previous[0])
         return True
+
+    def export_session(self, chat_id: str) -> Optional[dict]:
+        """The session as returned by the API, with the PDF text resolved from its handle."""
+        session = self.store.get(chat_id)
+        if session is None:
+            return None
+        
+        exported = session.export()
+        exported["pdf_text"] = self.store.get_blob(session.pdf_blob)
+        return exported
     
     def add_message(self, chat_id: str, message: dict) -> bool:
         
-        if chat_id not in self.sessions:
-            return False
-        
-        self.sessions[chat_id]["messages"].append({
+        entry = {
             **message,
-            "timestamp": datetime.now().isoformat()
-        })
-        return True
+            "timestamp": time.time()
+        }
+        return self.store.update(chat_id, lambda session: session.messages.append(entry))
     
     def delete_session(self, chat_id: str) -> bool:
        
-        if chat_id in self.sessions:
-            del self.sessions[chat_id]
-            return True
-        return False
+        with self._lock:
+            self.recent.pop(chat_id, None)
+        session = self.store.delete(chat_id)
+        if session is None:
+            return False
+        self.store.release_blob(session.pdf_blob)
+        return True
+
+    def end_session(self, chat_id: str) -> bool:
+        """Delete a session along with its agent, context and served-question history."""
+        agent_maneger.clean_session(chat_id)
+        question_dedup.forget(chat_id)
+        return self.delete_session(chat_id)
+
+    def resident_bytes(self) -> int:
+        """Bytes of document text and indexes held in this process, each object counted once.
+
+        Covers the blob store (session and context texts), pdf_cache and the agents'
+        indexes, which mostly share the same text and index objects.
+        """
+        objects = [(text, len(text)) for text in blob_store.texts()]
+        for document in pdf_cache.entries():
+            objects.append((document.text, len(document.text)))
+            objects.append((document.index, document.index.size()))
+        objects.extend((index, index.size()) for index in agent_maneger.loaded_indexes())
+        sizes = {id(obj): size for obj, size in objects}
+        return sum(sizes.values())
+
+    def unload(self, chat_id: str) -> None:
+        """Free what this process holds for a session beyond the store's copy; it reloads on next use."""
+        agent_maneger.unload(chat_id, evict_cached=True)
+        question_dedup.forget(chat_id)
+
+    def sweep(self) -> dict:
+        """Expire idle sessions and unload least recently used ones over the memory budget.
+
+        Sessions nobody has used for Config.SESSION_TTL seconds are deleted. Sessions this
+        process has not used for that long are unloaded (or forgotten, if another worker
+        deleted them), and then the least recently used ones while resident_bytes() exceeds
+        Config.SESSION_MEMORY_BUDGET. Unloading frees the session's agent, indexes and
+        cached documents nobody else loaded uses, but never its stored text: with the
+        memory store, that text alone can keep the process over budget.
+        """
+        cutoff = time.time() - Config.SESSION_TTL
+        expired = self.store.expired(cutoff)
+        for chat_id in expired:
+            self.end_session(chat_id)
+        
+        evicted = 0
+        while True:
+            over_budget = self.resident_bytes() > Config.SESSION_MEMORY_BUDGET
+            with self._lock:
+                if not self.recent:
+                    break
+                chat_id, last_used = next(iter(self.recent.items()))
+                if last_used >= cutoff and (not over_budget or len(self.recent) == 1):
+                    break
+                del self.recent[chat_id]
+            if self.store.get(chat_id) is None:
+                # Expired or deleted by another worker
+                agent_maneger.clean_session(chat_id)
+                question_dedup.forget(chat_id)
+            else:
+                self.unload(chat_id)
+            evicted += 1
+        
+        if expired or evicted:
+            log.info("session sweep", expired=len(expired), evicted=evicted, resident_bytes=self.resident_bytes())
+        return {"expired": len(expired), "evicted": evicted}
 
 
 session_manager = SessionManager()
\ No newline at end of file
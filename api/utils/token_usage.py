@@ -0,0 +1,86 @@
+import contextvars
+import threading
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from config import Config
+from utils.metrics import current_endpoint
+from utils.session_store import session_label
+
+# Question type (/generate's typeof) of the current request, if any
+_typeof: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("typeof", default=None)
+
+
+def set_typeof(typeof: str) -> None:
+    """Attribute the current request's LLM calls to a question type."""
+    _typeof.set(typeof)
+
+
+def reported_usage(message) -> Optional[Tuple[int, int]]:
+    """(input, output) tokens reported by the LLM on a response message, if any."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (getattr(message, "response_metadata", None) or {}).get("usage_metadata")
+    if usage:
+        return usage.get("prompt_token_count", 0), usage.get("candidates_token_count", 0)
+    return None
+
+
+class TokenUsage:
+    """Prompt, context and completion tokens of every LLM call, aggregated along several axes.
+
+    Calls are counted per session, endpoint, question type and document (the session's
+    context fingerprint). Counts are the LLM's own usage figures when the response
+    carries them and estimates otherwise; "estimated_calls" says how many were estimated.
+    """
+
+    def __init__(self):
+        self.totals = Counter()
+        self.sessions: Dict[str, Counter] = {}
+        self.endpoints: Dict[str, Counter] = {}
+        self.typeofs: Dict[str, Counter] = {}
+        self.documents: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+
+    def record(self, session_id: str, document: str, prompt_tokens: int, context_tokens: int,
+               completion_tokens: int, estimated: bool) -> None:
+        counts = Counter(calls=1, prompt_tokens=prompt_tokens, context_tokens=context_tokens,
+                         completion_tokens=completion_tokens, estimated_calls=int(estimated))
+        keys = ((self.sessions, session_id), (self.endpoints, current_endpoint()),
+                (self.typeofs, _typeof.get() or "none"), (self.documents, document or "none"))
+        with self._lock:
+            self.totals.update(counts)
+            for table, key in keys:
+                table.setdefault(key, Counter()).update(counts)
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    @staticmethod
+    def summarize(counts: Counter) -> dict:
+        summary = {field: counts[field] for field in
+                   ("calls", "prompt_tokens", "context_tokens", "completion_tokens", "estimated_calls")}
+        input_tokens = counts["prompt_tokens"] + counts["context_tokens"]
+        summary["total_tokens"] = input_tokens + counts["completion_tokens"]
+        summary["cost_usd"] = round((input_tokens * Config.LLM_INPUT_COST_PER_MTOK
+                                     + counts["completion_tokens"] * Config.LLM_OUTPUT_COST_PER_MTOK) / 1e6, 6)
+        return summary
+
+    def _top(self, table: Dict[str, Counter], top: int, label=str) -> Dict[str, dict]:
+        ranked = sorted(table.items(), key=lambda item: -(item[1]["prompt_tokens"] + item[1]["context_tokens"]
+                                                          + item[1]["completion_tokens"]))
+        return {label(key): self.summarize(counts) for key, counts in ranked[:top]}
+
+    def get_stats(self, top: int = 10) -> dict:
+        with self._lock:
+            return {
+                "totals": self.summarize(self.totals),
+                "by_endpoint": {key: self.summarize(counts) for key, counts in self.endpoints.items()},
+                "by_typeof": {key: self.summarize(counts) for key, counts in self.typeofs.items()},
+                "top_sessions": self._top(self.sessions, top, session_label),
+                "top_documents": self._top(self.documents, top),
+            }
+
+
+token_usage = TokenUsage()